@@ -0,0 +1,90 @@
+"""
+Backfill the denormalized student summary and donor wall of existing campaigns.
+Run with: python backfill_campaigns.py
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+import os
+from dotenv import load_dotenv
+from pathlib import Path
+
+from utils.campaigns import student_summary
+from utils.donor_wall import rebuild_donor_wall
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+BATCH_SIZE = 500
+
+
+async def backfill_campaigns(db):
+    """Copy each student's user and profile summary onto their campaigns."""
+    updated = 0
+    batch = []
+    
+    pipeline = [
+        {"$lookup": {
+            "from": "users",
+            "localField": "student_id",
+            "foreignField": "user_id",
+            "as": "_user"
+        }},
+        {"$lookup": {
+            "from": "student_profiles",
+            "localField": "student_id",
+            "foreignField": "user_id",
+            "as": "_profile"
+        }},
+        {"$project": {
+            "_id": 0,
+            "campaign_id": 1,
+            "_user": {"$arrayElemAt": ["$_user", 0]},
+            "_profile": {"$arrayElemAt": ["$_profile", 0]}
+        }}
+    ]
+    
+    async for campaign in db.campaigns.aggregate(pipeline):
+        batch.append(UpdateOne(
+            {"campaign_id": campaign["campaign_id"]},
+            {"$set": {"student": student_summary(campaign.get("_user"), campaign.get("_profile"))}}
+        ))
+        if len(batch) >= BATCH_SIZE:
+            result = await db.campaigns.bulk_write(batch, ordered=False)
+            updated += result.modified_count
+            batch = []
+    
+    if batch:
+        result = await db.campaigns.bulk_write(batch, ordered=False)
+        updated += result.modified_count
+    
+    return updated
+
+
+async def backfill_donor_walls(db):
+    """Build the materialized donor wall of every campaign."""
+    built = 0
+    async for campaign in db.campaigns.find({}, {"_id": 0, "campaign_id": 1}):
+        await rebuild_donor_wall(db, campaign["campaign_id"])
+        built += 1
+    return built
+
+
+async def main():
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    
+    print("Backfilling campaign student summaries...")
+    updated = await backfill_campaigns(db)
+    print(f"  - {updated} campaigns updated")
+    
+    print("Building donor walls...")
+    built = await backfill_donor_walls(db)
+    print(f"  - {built} donor walls built")
+    
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Benchmark campaign search: text index vs. unanchored regex.
+Seeds a throwaway database with 100k campaigns and times both query paths.
+Run with: python benchmark_search.py [--campaigns 100000] [--runs 20]
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+from pathlib import Path
+
+from routes.campaigns import _search_filter
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+WORDS = [
+    "education", "university", "tuition", "laptop", "medicine", "engineering",
+    "research", "community", "rural", "scholarship", "books", "housing",
+    "science", "future", "village", "doctor", "teacher", "software", "family", "dream"
+]
+QUERIES = ["engineering", "rural doctor", "scholarship", "software research"]
+BATCH_SIZE = 5000
+
+
+def random_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def seed(db, count):
+    rng = random.Random(42)
+    await db.campaigns.drop()
+    for start in range(0, count, BATCH_SIZE):
+        await db.campaigns.insert_many([
+            {
+                "campaign_id": f"campaign_{i:08d}",
+                "student_id": f"user_{i:08d}",
+                "title": random_text(rng, 6),
+                "story": random_text(rng, 60),
+                "category": "tuition",
+                "status": "active",
+                "created_at": f"2025-01-01T00:00:{i:08d}"
+            }
+            for i in range(start, min(start + BATCH_SIZE, count))
+        ])
+    await db.campaigns.create_index([("title", "text"), ("story", "text")])
+    await db.campaigns.create_index([("status", 1), ("created_at", -1), ("campaign_id", -1)])
+
+
+def regex_pipeline(search, limit):
+    """The previous implementation: unanchored case-insensitive regex on both fields."""
+    return [
+        {"$match": {"status": "active", "$or": [
+            {"title": {"$regex": re.escape(search), "$options": "i"}},
+            {"story": {"$regex": re.escape(search), "$options": "i"}}
+        ]}},
+        {"$sort": {"created_at": -1, "campaign_id": -1}},
+        {"$limit": limit}
+    ]
+
+
+def text_pipeline(search, limit):
+    """The current implementation: text index ranked by relevance."""
+    search_filter, _ = _search_filter(search)
+    return [
+        {"$match": {"status": "active", **search_filter}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1, "campaign_id": -1}},
+        {"$limit": limit}
+    ]
+
+
+async def time_pipeline(db, build, runs, limit):
+    timings = []
+    for i in range(runs):
+        pipeline = build(QUERIES[i % len(QUERIES)], limit)
+        started = time.perf_counter()
+        await db.campaigns.aggregate(pipeline).to_list(limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "median_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--campaigns", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=12)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+    
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ.get('DB_NAME', 'funded_db') + "_bench"]
+    
+    if not args.skip_seed:
+        print(f"Seeding {args.campaigns} campaigns into {db.name}...")
+        await seed(db, args.campaigns)
+    
+    for name, build in [("regex", regex_pipeline), ("text", text_pipeline)]:
+        result = await time_pipeline(db, build, args.runs, args.limit)
+        print(f"  {name:>5}: median {result['median_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms")
+    
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
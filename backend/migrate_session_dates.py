@@ -0,0 +1,68 @@
+"""
+Convert session timestamps stored as ISO strings into BSON dates so the
+TTL index on user_sessions.expires_at can expire them.
+Run with: python migrate_session_dates.py
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from datetime import datetime, timezone
+import os
+from dotenv import load_dotenv
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+BATCH_SIZE = 500
+DATE_FIELDS = ["expires_at", "created_at"]
+
+
+def parse_iso_datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_session_dates(db):
+    """Rewrite string timestamps of user_sessions as dates, in batches."""
+    updated = 0
+    batch = []
+    
+    query = {"$or": [{field: {"$type": "string"}} for field in DATE_FIELDS]}
+    projection = {field: 1 for field in DATE_FIELDS}
+    
+    async for session in db.user_sessions.find(query, projection):
+        converted = {
+            field: parse_iso_datetime(session[field])
+            for field in DATE_FIELDS
+            if isinstance(session.get(field), str)
+        }
+        batch.append(UpdateOne({"_id": session["_id"]}, {"$set": converted}))
+        if len(batch) >= BATCH_SIZE:
+            result = await db.user_sessions.bulk_write(batch, ordered=False)
+            updated += result.modified_count
+            batch = []
+    
+    if batch:
+        result = await db.user_sessions.bulk_write(batch, ordered=False)
+        updated += result.modified_count
+    
+    return updated
+
+
+async def main():
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    
+    print("Converting session timestamps to dates...")
+    updated = await migrate_session_dates(db)
+    print(f"  - {updated} sessions updated")
+    
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
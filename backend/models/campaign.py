@@ -31,6 +31,7 @@ class Campaign(BaseModel):
     target_amount: float
     raised_amount: float = 0.0
     donor_count: int = 0
+    donor_wall_version: int = 0
     timeline: str
     impact_log: Optional[str] = None
     status: CampaignStatus = CampaignStatus.ACTIVE
@@ -1,10 +1,25 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Response
 from datetime import datetime, timezone
 from typing import Optional
 import os
 
 from models.user import UserRole, VerificationStatus, StudentProfile, StudentProfileCreate
-from utils.auth import require_role, require_auth
+from utils.auth import (
+    create_session,
+    invalidate_user_sessions,
+    require_auth,
+    require_role,
+    set_session_cookie
+)
+from utils.campaigns import (
+    CAMPAIGN_PROJECTION,
+    adjust_campaign_facets,
+    invalidate_campaign_eligibility,
+    invalidate_campaign_listings,
+    refresh_student_summary
+)
+from utils.exports import donation_export_query, donation_export_response
+from utils.session_tokens import signed_sessions_enabled
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -68,6 +83,7 @@ async def update_user_role(request: Request, user_id: str):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_user_sessions(db, user_id)
     
     return {
         "success": True,
@@ -101,6 +117,7 @@ async def delete_user(request: Request, user_id: str):
     
     # Delete sessions
     await db.user_sessions.delete_many({"user_id": user_id})
+    await invalidate_user_sessions(db, user_id)
     
     return {
         "success": True,
@@ -204,6 +221,8 @@ async def verify_student(request: Request, user_id: str):
             {"$set": {"verification_documents": docs}}
         )
     
+    await refresh_student_summary(db, user_id)
+    
     return {
         "success": True,
         "message": f"Student {action}d successfully"
@@ -224,16 +243,22 @@ async def list_all_campaigns(request: Request, status: Optional[str] = None):
     if status:
         query["status"] = status
     
-    campaigns = await db.campaigns.find(query, {"_id": 0}).to_list(500)
+    campaigns = await db.campaigns.find(query, CAMPAIGN_PROJECTION).to_list(500)
     
+    # Student details come from the summary embedded in each campaign
     enriched = []
     for campaign in campaigns:
-        student = await db.users.find_one({"user_id": campaign["student_id"]}, {"_id": 0})
-        student_profile = await db.student_profiles.find_one({"user_id": campaign["student_id"]}, {"_id": 0})
+        student = campaign.get("student") or {}
         enriched.append({
             **campaign,
-            "student": student,
-            "student_profile": student_profile
+            "student_profile": {
+                "user_id": student.get("user_id"),
+                "country": student.get("country"),
+                "field_of_study": student.get("field_of_study"),
+                "university": student.get("university"),
+                "verification_status": student.get("verification_status"),
+                "verification_documents": student.get("verification_documents", [])
+            }
         })
     
     return {
@@ -257,7 +282,7 @@ async def update_campaign_status(request: Request, campaign_id: str):
     if new_status not in ["active", "suspended", "cancelled"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, CAMPAIGN_PROJECTION)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
@@ -269,6 +294,9 @@ async def update_campaign_status(request: Request, campaign_id: str):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    invalidate_campaign_listings()
+    invalidate_campaign_eligibility(campaign_id)
+    adjust_campaign_facets(campaign, {**campaign, "status": new_status})
     
     return {
         "success": True,
@@ -276,6 +304,30 @@ async def update_campaign_status(request: Request, campaign_id: str):
     }
 
 
+# ==================== Donation Export ====================
+
+@router.get("/donations/export")
+async def export_donations(
+    request: Request,
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    campaign_id: Optional[str] = None,
+    payment_status: Optional[str] = "paid"
+):
+    """
+    Stream all donations as CSV or NDJSON for finance.
+    Optional filters: `start`/`end` (ISO dates, end exclusive), `campaign_id`
+    and `payment_status` (pass an empty value for every status).
+    """
+    db = request.app.state.db
+    await require_role(request, db, ["admin"])
+    
+    base = {"payment_status": payment_status} if payment_status else {}
+    query = donation_export_query(base, start=start, end=end, campaign_id=campaign_id)
+    return donation_export_response(db, query, format, "donations")
+
+
 # ==================== Platform Statistics ====================
 
 @router.get("/stats")
@@ -342,7 +394,7 @@ async def get_platform_stats(request: Request):
 # ==================== Student Profile (Non-Admin) ====================
 
 @router.post("/students/profile", tags=["Students"])
-async def create_student_profile(request: Request, profile_data: StudentProfileCreate):
+async def create_student_profile(request: Request, response: Response, profile_data: StudentProfileCreate):
     """
     Create a student profile. This also updates user role to student.
     """
@@ -374,6 +426,14 @@ async def create_student_profile(request: Request, profile_data: StudentProfileC
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_user_sessions(db, user["user_id"])
+    
+    # Signed tokens carry the old role; hand out a fresh one
+    if signed_sessions_enabled():
+        user_doc = await db.users.find_one({"user_id": user["user_id"]}, {"_id": 0})
+        set_session_cookie(response, await create_session(db, user_doc))
+    
+    await refresh_student_summary(db, user["user_id"])
     
     return {
         "success": True,
@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Request, HTTPException, Response, Depends
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 import uuid
 import os
-import httpx
 import secrets
-import hashlib
 
 from models.user import User, UserRole
-from models.session import UserSession
-from utils.auth import get_current_user, require_auth
+from utils.auth import (
+    clear_session_cookie,
+    create_session,
+    get_current_user,
+    invalidate_user_sessions,
+    require_auth,
+    set_session_cookie
+)
+from utils.campaigns import refresh_student_summary
+from utils.google_auth import verify_google_id_token
+from utils.http_client import http_request
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -28,7 +35,6 @@ def get_google_oauth_config():
         "redirect_uri": redirect_uri,
         "auth_uri": "https://accounts.google.com/o/oauth2/v2/auth",
         "token_uri": "https://oauth2.googleapis.com/token",
-        "userinfo_uri": "https://www.googleapis.com/oauth2/v2/userinfo",
         "scopes": ["openid", "email", "profile"]
     }
 
@@ -89,41 +95,34 @@ async def google_callback(request: Request, response: Response):
     if not config:
         raise HTTPException(status_code=503, detail="OAuth not configured")
     
-    # Exchange code for tokens
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(
-            config["token_uri"],
-            data={
-                "code": code,
-                "client_id": config["client_id"],
-                "client_secret": config["client_secret"],
-                "redirect_uri": config["redirect_uri"],
-                "grant_type": "authorization_code"
-            }
-        )
-        
-        if token_response.status_code != 200:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Failed to exchange code: {token_response.text}"
-            )
-        
-        tokens = token_response.json()
-        access_token = tokens.get("access_token")
-        
-        if not access_token:
-            raise HTTPException(status_code=400, detail="No access token received")
-        
-        # Get user info
-        userinfo_response = await client.get(
-            config["userinfo_uri"],
-            headers={"Authorization": f"Bearer {access_token}"}
+    # Exchange code for tokens (codes are single use, so this is not retried)
+    token_response = await http_request(
+        "POST",
+        config["token_uri"],
+        data={
+            "code": code,
+            "client_id": config["client_id"],
+            "client_secret": config["client_secret"],
+            "redirect_uri": config["redirect_uri"],
+            "grant_type": "authorization_code"
+        }
+    )
+    
+    if token_response.status_code != 200:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Failed to exchange code: {token_response.text}"
         )
-        
-        if userinfo_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get user info")
-        
-        userinfo = userinfo_response.json()
+    
+    tokens = token_response.json()
+    
+    id_token = tokens.get("id_token")
+    if not id_token:
+        raise HTTPException(status_code=400, detail="No ID token received")
+    
+    # The openid scope returns a signed ID token; verify it locally instead
+    # of asking the userinfo endpoint
+    userinfo = await verify_google_id_token(id_token, config["client_id"])
     
     email = userinfo.get("email")
     name = userinfo.get("name")
@@ -147,6 +146,9 @@ async def google_callback(request: Request, response: Response):
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        # Keep the summary on the student's campaigns in sync
+        if existing_user.get("name") != name or existing_user.get("picture") != picture:
+            await refresh_student_summary(db, user_id)
     else:
         # Check if this should be initial admin
         initial_admin_email = os.environ.get("INITIAL_ADMIN_EMAIL", "").lower()
@@ -165,41 +167,16 @@ async def google_callback(request: Request, response: Response):
         user_dict["updated_at"] = user_dict["updated_at"].isoformat()
         await db.users.insert_one(user_dict)
     
-    # Generate secure session token
-    session_token = secrets.token_urlsafe(64)
-    
-    # Create session
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-    session = UserSession(
-        session_id=f"session_{uuid.uuid4().hex[:12]}",
-        user_id=user_id,
-        session_token=session_token,
-        expires_at=expires_at
-    )
-    session_dict = session.model_dump()
-    session_dict["expires_at"] = session_dict["expires_at"].isoformat()
-    session_dict["created_at"] = session_dict["created_at"].isoformat()
-    
-    # Remove old sessions for this user
+    # Replace any previous sessions for this user
     await db.user_sessions.delete_many({"user_id": user_id})
-    await db.user_sessions.insert_one(session_dict)
-    
-    # Determine cookie settings based on environment
-    is_production = os.environ.get("ENVIRONMENT", "development") == "production"
-    
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=is_production,
-        samesite="lax" if not is_production else "none",
-        path="/",
-        max_age=7 * 24 * 60 * 60
-    )
+    await invalidate_user_sessions(db, user_id)
     
     # Get full user data
     user_doc = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     
+    session_token = await create_session(db, user_doc)
+    set_session_cookie(response, session_token)
+    
     return {
         "success": True,
         "data": user_doc,
@@ -242,15 +219,9 @@ async def logout(request: Request, response: Response):
     
     if user:
         await db.user_sessions.delete_many({"user_id": user["user_id"]})
+        await invalidate_user_sessions(db, user["user_id"])
     
-    is_production = os.environ.get("ENVIRONMENT", "development") == "production"
-    
-    response.delete_cookie(
-        key="session_token",
-        path="/",
-        secure=is_production,
-        samesite="lax" if not is_production else "none"
-    )
+    clear_session_cookie(response)
     
     return {
         "success": True,
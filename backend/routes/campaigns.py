@@ -1,14 +1,47 @@
-from fastapi import APIRouter, Request, HTTPException, Query
+from fastapi import APIRouter, Request, HTTPException, Query, Response
 from typing import Optional, List
 from datetime import datetime, timezone
+import asyncio
+import hashlib
 import math
+import re
 
 from models.campaign import Campaign, CampaignCreate, CampaignUpdate, CampaignStatus
 from models.user import VerificationStatus
 from utils.auth import require_auth, require_role
+from utils.campaigns import (
+    CAMPAIGN_COUNT_CAP,
+    CAMPAIGN_PROJECTION,
+    LIST_HIDDEN_STUDENT_FIELDS,
+    adjust_campaign_facets,
+    campaign_count_cache,
+    campaign_list_cache,
+    count_campaigns,
+    get_campaign_facets,
+    invalidate_campaign_eligibility,
+    invalidate_campaign_listings,
+    student_summary
+)
+from utils.donor_wall import get_donor_wall
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter
 
 router = APIRouter(prefix="/campaigns", tags=["Campaigns"])
 
+# Queries shorter than this use an anchored prefix match on the title
+# instead of the text index, which does not match partial words.
+MIN_TEXT_SEARCH_LENGTH = 3
+
+
+def _search_filter(search: str) -> tuple:
+    """
+    Build the campaign filter for a search string.
+    Returns (filter, uses_text_index).
+    """
+    search = search.strip()
+    if len(search) < MIN_TEXT_SEARCH_LENGTH:
+        return {"title": {"$regex": f"^{re.escape(search)}", "$options": "i"}}, False
+    return {"$text": {"$search": search}}, True
+
 
 @router.get("")
 async def list_campaigns(
@@ -18,74 +51,142 @@ async def list_campaigns(
     field_of_study: Optional[str] = None,
     search: Optional[str] = None,
     page: int = Query(default=1, ge=1),
-    limit: int = Query(default=12, ge=1, le=50)
+    limit: int = Query(default=12, ge=1, le=50),
+    cursor: Optional[str] = None,
+    exact_total: bool = False
 ):
     """
     List all active campaigns with optional filters.
+    Pass `cursor` (from a previous `next_cursor`) for keyset pagination;
+    `page` is kept for numbered pagination.
+    Totals above CAMPAIGN_COUNT_CAP are capped unless `exact_total` is set;
+    `pagination.total_exact` says which was returned.
     """
     db = request.app.state.db
     
+    # Serve repeated anonymous browsing from the page cache
+    filter_key = (
+        category or None,
+        country or None,
+        field_of_study or None,
+        search.strip().lower() if search and search.strip() else None
+    )
+    cache_key = (filter_key, exact_total, limit, cursor or None, None if cursor else page)
+    cached = campaign_list_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     # Build query
     query = {"status": "active"}
     
     if category:
         query["category"] = category
     
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"story": {"$regex": search, "$options": "i"}}
-        ]
+    if country:
+        query["student.country"] = country
+    
+    if field_of_study:
+        query["student.field_of_study"] = field_of_study
+    
+    text_search = False
+    if search and search.strip():
+        search_filter, text_search = _search_filter(search)
+        query.update(search_filter)
     
-    # Get campaigns
+    # Text searches are ranked by relevance, everything else by recency
+    pipeline = [{"$match": query}]
+    sort_key = "created_at"
+    if text_search:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+        sort_key = "score"
+    
+    # Keyset pagination: continue after the last row of the previous page
     skip = (page - 1) * limit
-    campaigns = await db.campaigns.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    
-    # Filter by country/field_of_study (requires student profile lookup)
-    if country or field_of_study:
-        filtered_campaigns = []
-        for campaign in campaigns:
-            student_profile = await db.student_profiles.find_one(
-                {"user_id": campaign["student_id"]},
-                {"_id": 0}
-            )
-            if student_profile:
-                if country and student_profile.get("country") != country:
-                    continue
-                if field_of_study and student_profile.get("field_of_study") != field_of_study:
-                    continue
-            filtered_campaigns.append(campaign)
-        campaigns = filtered_campaigns
-    
-    # Enrich campaigns with student data
-    enriched_campaigns = []
-    for campaign in campaigns:
-        student = await db.users.find_one({"user_id": campaign["student_id"]}, {"_id": 0})
-        student_profile = await db.student_profiles.find_one({"user_id": campaign["student_id"]}, {"_id": 0})
-        
-        enriched_campaigns.append({
-            **campaign,
-            "student": {
-                "name": student.get("name") if student else "Unknown",
-                "picture": student.get("picture") if student else None,
-                "country": student_profile.get("country") if student_profile else None,
-                "field_of_study": student_profile.get("field_of_study") if student_profile else None,
-                "university": student_profile.get("university") if student_profile else None,
-                "verification_status": student_profile.get("verification_status") if student_profile else None
-            }
+    if cursor:
+        after = decode_cursor(cursor, [sort_key, "campaign_id"])
+        pipeline.append({"$match": keyset_filter(
+            sort_key, after[sort_key], "campaign_id", after["campaign_id"]
+        )})
+        skip = 0
+    
+    # Campaigns carry their student summary, so a page is one query.
+    # Filters run before pagination so pages are full and totals accurate.
+    # One extra row is fetched to tell whether another page exists.
+    pipeline += [
+        {"$sort": {sort_key: -1, "campaign_id": -1}},
+        {"$skip": skip},
+        {"$limit": limit + 1},
+        {"$project": {
+            **CAMPAIGN_PROJECTION,
+            **{f"student.{field}": 0 for field in LIST_HIDDEN_STUDENT_FIELDS}
+        }}
+    ]
+    enriched_campaigns = await db.campaigns.aggregate(pipeline).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(enriched_campaigns) > limit:
+        enriched_campaigns = enriched_campaigns[:limit]
+        last = enriched_campaigns[-1]
+        next_cursor = encode_cursor({
+            sort_key: last[sort_key],
+            "campaign_id": last["campaign_id"]
         })
     
-    # Get total count
-    total = await db.campaigns.count_documents(query)
+    # Get total count, shared by every page with the same filters
+    count_key = (filter_key, exact_total)
+    counted = campaign_count_cache.get(count_key)
+    if counted is None:
+        counted = await count_campaigns(db, query, None if exact_total else CAMPAIGN_COUNT_CAP)
+        campaign_count_cache.set(count_key, counted)
+    total, total_exact = counted
     
-    return {
-        "success": True,
-        "data": enriched_campaigns,
-        "pagination": {
+    if cursor:
+        pagination = {
+            "limit": limit,
+            "total": total,
+            "total_exact": total_exact,
+            "next_cursor": next_cursor
+        }
+    else:
+        pagination = {
             "page": page,
             "limit": limit,
             "total": total,
-            "total_pages": math.ceil(total / limit) if total > 0 else 0
+            "total_exact": total_exact,
+            "total_pages": math.ceil(total / limit) if total > 0 else 0,
+            "next_cursor": next_cursor
+        }
+    
+    result = {
+        "success": True,
+        "data": enriched_campaigns,
+        "pagination": pagination
+    }
+    campaign_list_cache.set(
+        cache_key,
+        result,
+        tags=[campaign["campaign_id"] for campaign in enriched_campaigns]
+    )
+    return result
+
+
+@router.get("/facets")
+async def get_facets(request: Request):
+    """
+    Active campaign counts per category, country and field of study,
+    for the browse filter sidebar.
+    """
+    db = request.app.state.db
+    counts = await get_campaign_facets(db)
+    
+    return {
+        "success": True,
+        "data": {
+            facet: [
+                {"value": value, "count": count}
+                for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))
+            ]
+            for facet, values in counts.items()
         }
     }
 
@@ -100,7 +201,7 @@ async def get_my_campaigns(request: Request):
     
     campaigns = await db.campaigns.find(
         {"student_id": user["user_id"]},
-        {"_id": 0}
+        CAMPAIGN_PROJECTION
     ).to_list(100)
     
     return {
@@ -109,53 +210,56 @@ async def get_my_campaigns(request: Request):
     }
 
 
+def _campaign_etag(campaign: dict) -> str:
+    """Weak ETag for the detail view: campaign updated_at plus donor-wall version."""
+    raw = f"{campaign['campaign_id']}:{campaign.get('updated_at')}:{campaign.get('donor_wall_version', 0)}"
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
 @router.get("/{campaign_id}")
-async def get_campaign(request: Request, campaign_id: str):
+async def get_campaign(request: Request, response: Response, campaign_id: str):
     """
     Get campaign details by ID.
+    Supports If-None-Match: a matching ETag returns 304 without loading donors.
     """
     db = request.app.state.db
+    if_none_match = request.headers.get("if-none-match")
     
-    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
-    
-    if not campaign:
-        raise HTTPException(status_code=404, detail="Campaign not found")
-    
-    # Get student data
-    student = await db.users.find_one({"user_id": campaign["student_id"]}, {"_id": 0})
-    student_profile = await db.student_profiles.find_one({"user_id": campaign["student_id"]}, {"_id": 0})
+    if if_none_match:
+        # Revalidation: check the validator before loading the donor wall
+        campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, CAMPAIGN_PROJECTION)
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        
+        etag = _campaign_etag(campaign)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        donor_wall = await get_donor_wall(db, campaign_id, limit=50)
+    else:
+        # Both lookups only need campaign_id, so run them concurrently
+        campaign, donor_wall = await asyncio.gather(
+            db.campaigns.find_one({"campaign_id": campaign_id}, CAMPAIGN_PROJECTION),
+            get_donor_wall(db, campaign_id, limit=50)
+        )
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        etag = _campaign_etag(campaign)
     
-    # Get recent donors (public donor wall)
-    donations = await db.donations.find(
-        {"campaign_id": campaign_id, "payment_status": "paid"},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(50)
-    
-    # Format donors for donor wall (hide names if anonymous)
-    donor_wall = []
-    for d in donations:
-        donor_wall.append({
-            "name": "Anonymous" if d.get("anonymous") else d.get("donor_name", "Anonymous"),
-            "amount": d.get("amount"),
-            "date": d.get("created_at"),
-            "anonymous": d.get("anonymous", False)
-        })
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
     
     return {
         "success": True,
         "data": {
             **campaign,
-            "student": {
-                "user_id": student.get("user_id") if student else None,
-                "name": student.get("name") if student else "Unknown",
-                "email": student.get("email") if student else None,
-                "picture": student.get("picture") if student else None,
-                "country": student_profile.get("country") if student_profile else None,
-                "field_of_study": student_profile.get("field_of_study") if student_profile else None,
-                "university": student_profile.get("university") if student_profile else None,
-                "verification_status": student_profile.get("verification_status") if student_profile else None,
-                "verification_documents": student_profile.get("verification_documents", []) if student_profile else []
-            },
             "donors": donor_wall
         }
     }
@@ -201,8 +305,12 @@ async def create_campaign(request: Request, campaign_data: CampaignCreate):
     campaign_dict = campaign.model_dump()
     campaign_dict["created_at"] = campaign_dict["created_at"].isoformat()
     campaign_dict["updated_at"] = campaign_dict["updated_at"].isoformat()
+    campaign_dict["student"] = student_summary(user, student_profile)
     
     await db.campaigns.insert_one(campaign_dict)
+    await db.donor_walls.insert_one({"campaign_id": campaign.campaign_id, "entries": []})
+    invalidate_campaign_listings()
+    adjust_campaign_facets(None, campaign_dict)
     
     return {
         "success": True,
@@ -220,7 +328,7 @@ async def update_campaign(request: Request, campaign_id: str, campaign_data: Cam
     user = await require_auth(request, db)
     
     # Get campaign
-    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, CAMPAIGN_PROJECTION)
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
@@ -237,8 +345,11 @@ async def update_campaign(request: Request, campaign_id: str, campaign_data: Cam
         {"campaign_id": campaign_id},
         {"$set": update_data}
     )
+    invalidate_campaign_listings()
+    invalidate_campaign_eligibility(campaign_id)
     
-    updated_campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+    updated_campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, CAMPAIGN_PROJECTION)
+    adjust_campaign_facets(campaign, updated_campaign)
     
     return {
         "success": True,
@@ -256,7 +367,7 @@ async def delete_campaign(request: Request, campaign_id: str):
     user = await require_auth(request, db)
     
     # Get campaign
-    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, CAMPAIGN_PROJECTION)
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
@@ -273,6 +384,9 @@ async def delete_campaign(request: Request, campaign_id: str):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    invalidate_campaign_listings()
+    invalidate_campaign_eligibility(campaign_id)
+    adjust_campaign_facets(campaign, {**campaign, "status": "cancelled"})
     
     return {
         "success": True,
@@ -1,16 +1,199 @@
-from fastapi import APIRouter, Request, HTTPException, Header
-from datetime import datetime, timezone
+from fastapi import APIRouter, Request, HTTPException, Header, Query
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import os
 import stripe
+import time
 import uuid
 import logging
 
 from models.donation import Donation, PaymentTransaction, PaymentStatus
 from utils.auth import get_current_user
+from utils.campaigns import get_campaign_eligibility
+from utils.donor_wall import get_donor_wall
+from utils.exports import donation_export_query, donation_export_response
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from utils.payment_events import PAYMENT_STATUS_MAX_WAIT, payment_status_notifier
+from utils.stripe_client import STRIPE_TIMEOUT, call_stripe
 
 router = APIRouter(prefix="/donations", tags=["Donations"])
 logger = logging.getLogger(__name__)
 
+PAYMENT_STATUS_PROJECTION = {"_id": 0, "payment_status": 1, "amount": 1, "campaign_id": 1}
+
+# Statuses a payment does not leave on its own
+SETTLED_PAYMENT_STATUSES = {PaymentStatus.PAID.value, PaymentStatus.FAILED.value, PaymentStatus.EXPIRED.value}
+
+# Campaign fields shown next to each donation in a donor's history
+MY_DONATION_CAMPAIGN_PROJECTION = {
+    "_id": 0,
+    "campaign_id": 1,
+    "title": 1,
+    "category": 1,
+    "status": 1,
+    "target_amount": 1,
+    "raised_amount": 1,
+    "student.name": 1,
+    "student.picture": 1
+}
+
+
+async def reserve_checkout(db, transaction_dict: dict) -> Optional[dict]:
+    """
+    Atomically claim a checkout's idempotency key by inserting its transaction.
+    Returns None when claimed, otherwise the transaction already holding the key.
+    """
+    try:
+        return await db.payment_transactions.find_one_and_update(
+            {"idempotency_key": transaction_dict["idempotency_key"]},
+            {"$setOnInsert": transaction_dict},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # Lost a concurrent upsert on the unique index to the request that claimed it
+        return await db.payment_transactions.find_one(
+            {"idempotency_key": transaction_dict["idempotency_key"]},
+            {"_id": 0}
+        )
+
+
+def _reservation_time() -> datetime:
+    # Millisecond precision, as stored by MongoDB, so it can be matched exactly
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+async def take_over_checkout(db, idempotency_key: str) -> Optional[dict]:
+    """
+    Claim a reservation whose holder has had STRIPE_TIMEOUT to get its session
+    and did not (e.g. the process died). Returns the reclaimed transaction, or
+    None if the reservation is still live or already finished. Stripe's
+    idempotency key makes the repeated Session.create return the same session.
+    """
+    now = _reservation_time()
+    transaction = await db.payment_transactions.find_one_and_update(
+        {
+            "idempotency_key": idempotency_key,
+            "checkout_url": None,
+            "$or": [
+                {"reserved_at": {"$lte": now - timedelta(seconds=STRIPE_TIMEOUT)}},
+                {"reserved_at": {"$exists": False}}
+            ]
+        },
+        {"$set": {"reserved_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if transaction:
+        transaction["reserved_at"] = now
+    return transaction
+
+
+async def wait_for_checkout(db, idempotency_key: str) -> Optional[dict]:
+    """
+    Wait for the request holding `idempotency_key` to get its Stripe session.
+    Returns None if it gave up or did not finish within STRIPE_TIMEOUT.
+    """
+    deadline = time.monotonic() + STRIPE_TIMEOUT
+    delay = 0.05
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        transaction = await db.payment_transactions.find_one(
+            {"idempotency_key": idempotency_key},
+            {"_id": 0}
+        )
+        if not transaction or transaction.get("checkout_url"):
+            return transaction
+        delay = min(delay * 2, 0.5)
+    return None
+
+
+async def claim_checkout(db, transaction_dict: dict) -> tuple:
+    """
+    Claim a checkout's idempotency key. Returns (transaction, claimed): the
+    transaction to create a Stripe session for when claimed, otherwise the
+    finished checkout holding the key. Raises 409 while another request is
+    still creating it.
+    """
+    idempotency_key = transaction_dict["idempotency_key"]
+    for _ in range(2):
+        transaction_dict["reserved_at"] = _reservation_time()
+        existing = await reserve_checkout(db, transaction_dict)
+        if not existing:
+            return transaction_dict, True
+        if existing.get("checkout_url"):
+            return existing, False
+        
+        # Take over a reservation abandoned by its holder, otherwise wait for it
+        reclaimed = await take_over_checkout(db, idempotency_key)
+        if not reclaimed:
+            existing = await wait_for_checkout(db, idempotency_key)
+            if existing:
+                return existing, False
+            reclaimed = await take_over_checkout(db, idempotency_key)
+        if reclaimed:
+            return reclaimed, True
+        # The holder released the key (e.g. Stripe failed); claim it again
+    raise HTTPException(status_code=409, detail="Checkout is already in progress, please try again")
+
+
+async def create_stripe_session(db, stripe_api_key: str, transaction: dict, origin_url: str):
+    """Create the Stripe checkout session for a reserved transaction."""
+    campaign_id = transaction["campaign_id"]
+    idempotency_key = transaction["idempotency_key"]
+    
+    # Verify campaign exists and is active
+    campaign = await get_campaign_eligibility(db, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    if campaign.get("status") != "active":
+        raise HTTPException(status_code=400, detail="Campaign is not accepting donations")
+    
+    success_url = f"{origin_url}/donate/success?session_id={{CHECKOUT_SESSION_ID}}&campaign_id={campaign_id}"
+    cancel_url = f"{origin_url}/campaign/{campaign_id}"
+    
+    try:
+        return await call_stripe(
+            stripe.checkout.Session.create,
+            api_key=stripe_api_key,
+            payment_method_types=["card"],
+            line_items=[{
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {
+                        "name": f"Donation: {campaign.get('title', 'Campaign')[:50]}",
+                        "description": f"Supporting education",
+                    },
+                    "unit_amount": int(transaction["amount"] * 100),
+                },
+                "quantity": 1,
+            }],
+            mode="payment",
+            success_url=success_url,
+            cancel_url=cancel_url,
+            customer_email=transaction["donor_email"] if transaction["donor_email"] else None,
+            metadata={
+                "campaign_id": campaign_id,
+                "donor_id": transaction["donor_id"] or "",
+                "donor_name": transaction["donor_name"],
+                "anonymous": str(transaction["anonymous"]),
+                "idempotency_key": idempotency_key
+            },
+            idempotency_key=idempotency_key
+        )
+    except stripe.error.StripeError as e:
+        logger.error(f"Stripe error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        # Retrying with the same idempotency key returns the same session
+        logger.error(f"Stripe checkout timed out for campaign {campaign_id}")
+        raise HTTPException(status_code=504, detail="Payment service timed out, please try again")
+
 
 @router.post("/checkout")
 async def create_checkout(request: Request):
@@ -47,28 +230,6 @@ async def create_checkout(request: Request):
     if not idempotency_key:
         idempotency_key = f"{campaign_id}_{amount}_{uuid.uuid4().hex[:16]}"
     
-    # Check for existing transaction with same idempotency key
-    existing = await db.payment_transactions.find_one(
-        {"idempotency_key": idempotency_key},
-        {"_id": 0}
-    )
-    if existing:
-        return {
-            "success": True,
-            "data": {
-                "url": existing.get("checkout_url"),
-                "session_id": existing.get("session_id")
-            },
-            "message": "Existing checkout session returned"
-        }
-    
-    # Verify campaign exists and is active
-    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
-    if not campaign:
-        raise HTTPException(status_code=404, detail="Campaign not found")
-    if campaign.get("status") != "active":
-        raise HTTPException(status_code=400, detail="Campaign is not accepting donations")
-    
     # Get current user if authenticated
     user = await get_current_user(request, db)
     donor_id = user.get("user_id") if user else None
@@ -80,90 +241,111 @@ async def create_checkout(request: Request):
     if not stripe_api_key:
         raise HTTPException(status_code=503, detail="Payment service not configured")
     
-    stripe.api_key = stripe_api_key
-    
-    success_url = f"{origin_url}/donate/success?session_id={{CHECKOUT_SESSION_ID}}&campaign_id={campaign_id}"
-    cancel_url = f"{origin_url}/campaign/{campaign_id}"
+    transaction = PaymentTransaction(
+        session_id="",
+        campaign_id=campaign_id,
+        donor_id=donor_id,
+        donor_name=donor_name,
+        donor_email=donor_email,
+        amount=amount,
+        currency="usd",
+        anonymous=anonymous,
+        payment_status=PaymentStatus.INITIATED,
+        metadata={"idempotency_key": idempotency_key}
+    )
+    transaction_dict = transaction.model_dump()
+    transaction_dict["created_at"] = transaction_dict["created_at"].isoformat()
+    transaction_dict["updated_at"] = transaction_dict["updated_at"].isoformat()
+    transaction_dict["idempotency_key"] = idempotency_key
+    transaction_dict["checkout_url"] = None
+    # Placeholder until Stripe answers; session_id is uniquely indexed
+    transaction_dict["session_id"] = f"pending_{transaction.transaction_id}"
+    # Stripe rejects a reused idempotency key with different parameters, so a
+    # takeover must rebuild the same redirect URLs
+    transaction_dict["origin_url"] = origin_url
     
-    try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[{
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {
-                        "name": f"Donation: {campaign.get('title', 'Campaign')[:50]}",
-                        "description": f"Supporting education",
-                    },
-                    "unit_amount": int(amount * 100),
-                },
-                "quantity": 1,
-            }],
-            mode="payment",
-            success_url=success_url,
-            cancel_url=cancel_url,
-            customer_email=donor_email if donor_email else None,
-            metadata={
-                "campaign_id": campaign_id,
-                "donor_id": donor_id or "",
-                "donor_name": donor_name,
-                "anonymous": str(anonymous),
-                "idempotency_key": idempotency_key
-            },
-            idempotency_key=idempotency_key
-        )
-        
-        # Create transaction record
-        transaction = PaymentTransaction(
-            session_id=session.id,
-            campaign_id=campaign_id,
-            donor_id=donor_id,
-            donor_name=donor_name,
-            donor_email=donor_email,
-            amount=amount,
-            currency="usd",
-            anonymous=anonymous,
-            payment_status=PaymentStatus.INITIATED,
-            metadata={
-                "idempotency_key": idempotency_key,
-                "checkout_url": session.url
-            }
-        )
-        
-        transaction_dict = transaction.model_dump()
-        transaction_dict["created_at"] = transaction_dict["created_at"].isoformat()
-        transaction_dict["updated_at"] = transaction_dict["updated_at"].isoformat()
-        transaction_dict["idempotency_key"] = idempotency_key
-        transaction_dict["checkout_url"] = session.url
-        
-        await db.payment_transactions.insert_one(transaction_dict)
-        
+    # Claim the idempotency key; duplicates get the first request's checkout
+    transaction_dict, claimed = await claim_checkout(db, transaction_dict)
+    if not claimed:
         return {
             "success": True,
             "data": {
-                "url": session.url,
-                "session_id": session.id
-            }
+                "url": transaction_dict.get("checkout_url"),
+                "session_id": transaction_dict.get("session_id")
+            },
+            "message": "Existing checkout session returned"
         }
-    except stripe.error.StripeError as e:
-        logger.error(f"Stripe error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        session = await create_stripe_session(
+            db, stripe_api_key, transaction_dict, transaction_dict.get("origin_url") or origin_url
+        )
+    except Exception:
+        # Release the key so the client can retry it, unless another request took it over
+        await db.payment_transactions.delete_one({
+            "transaction_id": transaction_dict["transaction_id"],
+            "checkout_url": None,
+            "reserved_at": transaction_dict["reserved_at"]
+        })
+        raise
+    
+    await db.payment_transactions.update_one(
+        {"transaction_id": transaction_dict["transaction_id"]},
+        {"$set": {
+            "session_id": session.id,
+            "checkout_url": session.url,
+            "metadata.checkout_url": session.url
+        }}
+    )
+    
+    return {
+        "success": True,
+        "data": {
+            "url": session.url,
+            "session_id": session.id
+        }
+    }
 
 
 @router.get("/status/{session_id}")
-async def get_payment_status(request: Request, session_id: str):
+async def get_payment_status(
+    request: Request,
+    session_id: str,
+    wait: float = Query(default=0, ge=0)
+):
     """
-    Get payment status. Primarily for polling after webhook.
+    Get payment status.
+    With `wait` (seconds), a pending payment is held open until the webhook
+    settles it or the wait runs out, replacing client-side polling.
+    Waits longer than PAYMENT_STATUS_MAX_WAIT are shortened to it.
     """
     db = request.app.state.db
+    wait = min(wait, PAYMENT_STATUS_MAX_WAIT)
     
-    transaction = await db.payment_transactions.find_one(
-        {"session_id": session_id},
-        {"_id": 0}
-    )
-    
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+    # Subscribe before reading so a webhook landing in between is not missed
+    event = payment_status_notifier.subscribe(session_id) if wait else None
+    try:
+        transaction = await db.payment_transactions.find_one(
+            {"session_id": session_id},
+            PAYMENT_STATUS_PROJECTION
+        )
+        
+        if not transaction:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        
+        if event and transaction.get("payment_status") not in SETTLED_PAYMENT_STATUSES:
+            try:
+                await asyncio.wait_for(event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                transaction = await db.payment_transactions.find_one(
+                    {"session_id": session_id},
+                    PAYMENT_STATUS_PROJECTION
+                )
+    finally:
+        if event:
+            payment_status_notifier.unsubscribe(session_id, event)
     
     return {
         "success": True,
@@ -183,19 +365,7 @@ async def get_campaign_donations(request: Request, campaign_id: str):
     """
     db = request.app.state.db
     
-    donations = await db.donations.find(
-        {"campaign_id": campaign_id, "payment_status": "paid"},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    
-    donor_wall = []
-    for d in donations:
-        donor_wall.append({
-            "name": "Anonymous" if d.get("anonymous") else d.get("donor_name", "Anonymous"),
-            "amount": d.get("amount"),
-            "date": d.get("created_at"),
-            "anonymous": d.get("anonymous", False)
-        })
+    donor_wall = await get_donor_wall(db, campaign_id)
     
     return {
         "success": True,
@@ -204,9 +374,15 @@ async def get_campaign_donations(request: Request, campaign_id: str):
 
 
 @router.get("/my")
-async def get_my_donations(request: Request):
+async def get_my_donations(
+    request: Request,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
     """
-    Get current user's donation history.
+    Get current user's donation history, newest first.
+    Pass `cursor` (from a previous `next_cursor`) for the next page. The first
+    page also carries a `summary` of all paid donations.
     """
     db = request.app.state.db
     user = await get_current_user(request, db)
@@ -214,20 +390,92 @@ async def get_my_donations(request: Request):
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    donations = await db.donations.find(
-        {"donor_id": user["user_id"], "payment_status": "paid"},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    query = {"donor_id": user["user_id"], "payment_status": "paid"}
+    page_query = query
+    if cursor:
+        after = decode_cursor(cursor, ["created_at", "donation_id"])
+        page_query = {**query, **keyset_filter("created_at", after["created_at"], "donation_id", after["donation_id"])}
     
-    enriched_donations = []
-    for d in donations:
-        campaign = await db.campaigns.find_one(
-            {"campaign_id": d["campaign_id"]},
-            {"_id": 0}
-        )
-        enriched_donations.append({**d, "campaign": campaign})
+    donations = await db.donations.find(page_query, {"_id": 0}).sort(
+        [("created_at", -1), ("donation_id", -1)]
+    ).to_list(limit + 1)
     
-    return {
+    next_cursor = None
+    if len(donations) > limit:
+        donations = donations[:limit]
+        next_cursor = encode_cursor({
+            "created_at": donations[-1]["created_at"],
+            "donation_id": donations[-1]["donation_id"]
+        })
+    
+    # One query for every campaign on the page
+    campaign_ids = list({d["campaign_id"] for d in donations})
+    campaigns = {}
+    if campaign_ids:
+        async for campaign in db.campaigns.find(
+            {"campaign_id": {"$in": campaign_ids}},
+            MY_DONATION_CAMPAIGN_PROJECTION
+        ):
+            campaigns[campaign["campaign_id"]] = campaign
+    
+    enriched_donations = [{**d, "campaign": campaigns.get(d["campaign_id"])} for d in donations]
+    
+    result = {
         "success": True,
-        "data": enriched_donations
+        "data": enriched_donations,
+        "pagination": {
+            "limit": limit,
+            "next_cursor": next_cursor
+        }
+    }
+    if not cursor:
+        result["summary"] = await donation_summary(db, query)
+    return result
+
+
+@router.get("/my/export")
+async def export_my_donations(
+    request: Request,
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    campaign_id: Optional[str] = None
+):
+    """
+    Stream the current user's paid donations as CSV or NDJSON.
+    Optional filters: `start`/`end` (ISO dates, end exclusive) and `campaign_id`.
+    """
+    db = request.app.state.db
+    user = await get_current_user(request, db)
+    
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    query = donation_export_query(
+        {"donor_id": user["user_id"], "payment_status": "paid"},
+        start=start,
+        end=end,
+        campaign_id=campaign_id
+    )
+    return donation_export_response(db, query, format, "my-donations")
+
+
+async def donation_summary(db, query: dict) -> dict:
+    """Total given, donation count and distinct campaigns for matching donations."""
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total_donated": {"$sum": "$amount"},
+            "donation_count": {"$sum": 1},
+            "campaign_ids": {"$addToSet": "$campaign_id"}
+        }}
+    ]
+    groups = await db.donations.aggregate(pipeline).to_list(1)
+    if not groups:
+        return {"total_donated": 0, "donation_count": 0, "campaign_count": 0}
+    return {
+        "total_donated": groups[0]["total_donated"],
+        "donation_count": groups[0]["donation_count"],
+        "campaign_count": len(groups[0]["campaign_ids"])
     }
@@ -2,7 +2,6 @@ from fastapi import APIRouter, Request, HTTPException, UploadFile, File, Form
 from typing import Optional
 import os
 import uuid
-import httpx
 import hashlib
 import hmac
 import time
@@ -10,6 +9,7 @@ import json
 import base64
 
 from utils.auth import require_auth
+from utils.http_client import http_request
 
 router = APIRouter(prefix="/uploads", tags=["Uploads"])
 
@@ -115,22 +115,22 @@ async def upload_image(request: Request, file: UploadFile = File(...), folder: s
     signature = generate_cloudinary_signature(params, config["api_secret"])
     
     # Upload to Cloudinary
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"https://api.cloudinary.com/v1_1/{config['cloud_name']}/image/upload",
-            data={
-                "timestamp": timestamp,
-                "public_id": public_id,
-                "signature": signature,
-                "api_key": config["api_key"]
-            },
-            files={"file": (file.filename, content, file.content_type)}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to upload image")
-        
-        result = response.json()
+    response = await http_request(
+        "POST",
+        f"https://api.cloudinary.com/v1_1/{config['cloud_name']}/image/upload",
+        data={
+            "timestamp": timestamp,
+            "public_id": public_id,
+            "signature": signature,
+            "api_key": config["api_key"]
+        },
+        files={"file": (file.filename, content, file.content_type)}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to upload image")
+    
+    result = response.json()
     
     return {
         "success": True,
@@ -180,23 +180,23 @@ async def upload_document(request: Request, file: UploadFile = File(...), doc_ty
     signature = generate_cloudinary_signature(params, config["api_secret"])
     
     # Upload to Cloudinary
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"https://api.cloudinary.com/v1_1/{config['cloud_name']}/auto/upload",
-            data={
-                "timestamp": timestamp,
-                "public_id": public_id,
-                "signature": signature,
-                "api_key": config["api_key"],
-                "resource_type": "auto"
-            },
-            files={"file": (file.filename, content, file.content_type)}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to upload document")
-        
-        result = response.json()
+    response = await http_request(
+        "POST",
+        f"https://api.cloudinary.com/v1_1/{config['cloud_name']}/auto/upload",
+        data={
+            "timestamp": timestamp,
+            "public_id": public_id,
+            "signature": signature,
+            "api_key": config["api_key"],
+            "resource_type": "auto"
+        },
+        files={"file": (file.filename, content, file.content_type)}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to upload document")
+    
+    result = response.json()
     
     return {
         "success": True,
@@ -234,19 +234,21 @@ async def delete_file(request: Request, public_id: str):
     }
     signature = generate_cloudinary_signature(params, config["api_secret"])
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"https://api.cloudinary.com/v1_1/{config['cloud_name']}/image/destroy",
-            data={
-                "timestamp": timestamp,
-                "public_id": public_id,
-                "signature": signature,
-                "api_key": config["api_key"]
-            }
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to delete file")
+    # Destroying a public_id twice is harmless, so this may be retried
+    response = await http_request(
+        "POST",
+        f"https://api.cloudinary.com/v1_1/{config['cloud_name']}/image/destroy",
+        idempotent=True,
+        data={
+            "timestamp": timestamp,
+            "public_id": public_id,
+            "signature": signature,
+            "api_key": config["api_key"]
+        }
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to delete file")
     
     return {
         "success": True,
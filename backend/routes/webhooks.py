@@ -1,40 +1,111 @@
 from fastapi import APIRouter, Request, HTTPException, Header
 from datetime import datetime, timezone
+import json
 import os
 import stripe
 import logging
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from models.donation import Donation, PaymentStatus
+from utils.campaigns import adjust_campaign_facets, invalidate_campaign_eligibility, invalidate_campaign_listings
+from utils.donor_wall import push_donor_wall_entry, rebuild_donor_wall
+from utils.payment_events import payment_status_notifier
+from utils.webhook_queue import (
+    WEBHOOK_LEASE_SECONDS,
+    begin_event_processing,
+    enqueue_webhook_event,
+    finish_event_processing,
+    release_event_processing
+)
 
 router = APIRouter(prefix="/stripe", tags=["Stripe Webhooks"])
 logger = logging.getLogger(__name__)
 
+# "atomic" applies a payment as independent single-document writes;
+# "transaction" wraps them in one multi-document transaction
+PAYMENT_WRITE_MODE = os.environ.get("PAYMENT_WRITE_MODE", "atomic")
 
-async def process_successful_payment(db, session_id: str, metadata: dict):
+# Checkout sessions remembered on each campaign so a retried payment is never
+# added to its totals twice; far more than can arrive within the retry window
+CAMPAIGN_APPLIED_SESSIONS = int(os.environ.get("CAMPAIGN_APPLIED_SESSIONS", "500"))
+
+CAMPAIGN_PAYMENT_PROJECTION = {
+    "_id": 0,
+    "campaign_id": 1,
+    "status": 1,
+    "raised_amount": 1,
+    "target_amount": 1,
+    "category": 1,
+    "student.country": 1,
+    "student.field_of_study": 1
+}
+
+
+def _campaign_payment_update(amount: float, updated_at: str, session_id: str) -> list:
     """
-    Process a successful payment - create donation and update campaign.
-    Uses transaction-like pattern with idempotency check.
+    Pipeline update adding a payment to a campaign. Completion is decided in
+    the same write, against the new total, so no concurrent payment can slip
+    between the increment and the check. The session is recorded in the same
+    write; match on `applied_sessions: {"$ne": session_id}` to apply it once.
     """
-    # Check if already processed (idempotency)
-    existing_donation = await db.donations.find_one(
-        {"stripe_session_id": session_id},
-        {"_id": 0}
-    )
-    if existing_donation:
-        logger.info(f"Payment {session_id} already processed, skipping")
-        return
+    raised_amount = {"$add": [{"$ifNull": ["$raised_amount", 0]}, amount]}
+    return [{"$set": {
+        "applied_sessions": {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$applied_sessions", []]}, [session_id]]},
+            -CAMPAIGN_APPLIED_SESSIONS
+        ]},
+        "raised_amount": raised_amount,
+        "donor_count": {"$add": [{"$ifNull": ["$donor_count", 0]}, 1]},
+        "donor_wall_version": {"$add": [{"$ifNull": ["$donor_wall_version", 0]}, 1]},
+        "updated_at": updated_at,
+        "status": {"$cond": [
+            {"$and": [
+                {"$eq": ["$status", "active"]},
+                {"$gte": [raised_amount, "$target_amount"]}
+            ]},
+            "completed",
+            "$status"
+        ]}
+    }}]
+
+
+def _completed_by_payment(campaign: dict, amount: float) -> bool:
+    """Whether this payment is the one that moved the campaign past its target."""
+    if campaign.get("status") != "completed":
+        return False
+    raised_before = round(campaign.get("raised_amount", 0) - amount, 2)
+    return raised_before < campaign.get("target_amount", 0)
+
+
+async def _record_successful_payment(db, session_id: str, metadata: dict, session=None):
+    """
+    Write a paid checkout: transaction status, donation, donor wall entry and
+    campaign totals. Returns (transaction, campaign after the update), or None
+    if the transaction does not exist. Raises DuplicateKeyError when the
+    payment was already recorded and applied to its campaign.
     
-    # Get transaction record
-    transaction = await db.payment_transactions.find_one(
+    Outside a transaction a retry after a partial failure finds the donation
+    already inserted and still applies the campaign write, which is skipped
+    if that write landed too.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    transaction = await db.payment_transactions.find_one_and_update(
         {"session_id": session_id},
-        {"_id": 0}
+        {"$set": {
+            "payment_status": "paid",
+            "stripe_payment_intent": metadata.get("payment_intent"),
+            "updated_at": now
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+        session=session
     )
-    
     if not transaction:
-        logger.error(f"Transaction not found for session {session_id}")
-        return
+        return None
     
-    # Create donation record
     donation = Donation(
         campaign_id=transaction["campaign_id"],
         donor_id=transaction.get("donor_id"),
@@ -50,43 +121,64 @@ async def process_successful_payment(db, session_id: str, metadata: dict):
     donation_dict["created_at"] = donation_dict["created_at"].isoformat()
     donation_dict["stripe_payment_intent"] = metadata.get("payment_intent")
     
-    await db.donations.insert_one(donation_dict)
+    # The unique stripe_session_id index makes this the idempotency check
+    retried = False
+    try:
+        await db.donations.insert_one(donation_dict, session=session)
+    except DuplicateKeyError:
+        if session is not None:
+            raise
+        retried = True
+    else:
+        await push_donor_wall_entry(db, donation_dict, session=session)
     
-    # Update transaction status
-    await db.payment_transactions.update_one(
-        {"session_id": session_id},
-        {"$set": {
-            "payment_status": "paid",
-            "stripe_payment_intent": metadata.get("payment_intent"),
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
+    campaign = await db.campaigns.find_one_and_update(
+        {"campaign_id": transaction["campaign_id"], "applied_sessions": {"$ne": session_id}},
+        _campaign_payment_update(transaction["amount"], now, session_id),
+        projection=CAMPAIGN_PAYMENT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+        session=session
     )
+    if retried:
+        if campaign is None:
+            raise DuplicateKeyError(f"Payment {session_id} already applied")
+        logger.warning(f"Resumed partially applied payment {session_id}")
+        # The earlier attempt may or may not have pushed its wall entry
+        await rebuild_donor_wall(db, transaction["campaign_id"])
+    return transaction, campaign
+
+
+async def process_successful_payment(db, session_id: str, metadata: dict):
+    """
+    Process a successful payment - create donation and update campaign.
+    With PAYMENT_WRITE_MODE=transaction the writes commit together
+    (requires a replica set); otherwise each write is atomic on its own.
+    """
+    try:
+        if PAYMENT_WRITE_MODE == "transaction":
+            async with await db.client.start_session() as session:
+                async with session.start_transaction():
+                    result = await _record_successful_payment(db, session_id, metadata, session=session)
+        else:
+            result = await _record_successful_payment(db, session_id, metadata)
+    except DuplicateKeyError:
+        logger.info(f"Payment {session_id} already processed, skipping")
+        return
     
-    # Update campaign
-    await db.campaigns.update_one(
-        {"campaign_id": transaction["campaign_id"]},
-        {
-            "$inc": {
-                "raised_amount": transaction["amount"],
-                "donor_count": 1
-            },
-            "$set": {
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-        }
-    )
+    if result is None:
+        logger.error(f"Transaction not found for session {session_id}")
+        return
     
-    # Check if campaign reached target
-    campaign = await db.campaigns.find_one(
-        {"campaign_id": transaction["campaign_id"]},
-        {"_id": 0}
-    )
-    if campaign and campaign.get("raised_amount", 0) >= campaign.get("target_amount", 0):
-        await db.campaigns.update_one(
-            {"campaign_id": transaction["campaign_id"]},
-            {"$set": {"status": "completed"}}
-        )
+    transaction, campaign = result
+    if campaign and _completed_by_payment(campaign, transaction["amount"]):
+        # Completed campaigns leave the public listing, shifting pages
+        invalidate_campaign_listings()
+        invalidate_campaign_eligibility(transaction["campaign_id"])
+        adjust_campaign_facets({**campaign, "status": "active"}, campaign)
+    else:
+        invalidate_campaign_listings(transaction["campaign_id"])
     
+    payment_status_notifier.notify(session_id)
     logger.info(f"Successfully processed payment {session_id}")
 
 
@@ -99,6 +191,7 @@ async def process_payment_failure(db, session_id: str):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    payment_status_notifier.notify(session_id)
     logger.info(f"Marked payment {session_id} as failed")
 
 
@@ -130,17 +223,84 @@ async def process_refund(db, payment_intent_id: str, refund_amount: float):
         {
             "$inc": {
                 "raised_amount": -refund_amount,
-                "donor_count": -1
+                "donor_count": -1,
+                "donor_wall_version": 1
             },
             "$set": {
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }
         }
     )
+    await rebuild_donor_wall(db, donation["campaign_id"])
+    invalidate_campaign_listings(donation["campaign_id"])
     
     logger.info(f"Processed refund for payment intent {payment_intent_id}")
 
 
+async def handle_webhook_event(db, payload: dict):
+    """
+    Apply one queued Stripe event. Raises on failure so the queue retries it.
+    Events already applied (per processed_events) are skipped.
+    """
+    event = stripe.Event.construct_from(payload, os.environ.get("STRIPE_API_KEY"))
+    owner = uuid.uuid4().hex
+    leased_at = time.monotonic()
+    if not await begin_event_processing(db, event.id, event.type, owner):
+        logger.info(f"Stripe event {event.id} already processed, skipping")
+        return
+    
+    try:
+        await _dispatch_webhook_event(db, event)
+    except Exception:
+        await release_event_processing(db, event.id, owner)
+        raise
+    # Keep retrying the marker write only while our lease is well clear of
+    # expiry, so no other worker can take the event over in the meantime
+    retry_for = WEBHOOK_LEASE_SECONDS / 2 - (time.monotonic() - leased_at)
+    await finish_event_processing(db, event.id, owner, retry_for=max(retry_for, 0))
+
+
+async def _dispatch_webhook_event(db, event):
+    event_type = event.type
+    
+    if event_type == "checkout.session.completed":
+        session = event.data.object
+        if session.payment_status == "paid":
+            await process_successful_payment(
+                db, 
+                session.id,
+                {"payment_intent": session.payment_intent}
+            )
+    
+    elif event_type == "checkout.session.async_payment_succeeded":
+        session = event.data.object
+        await process_successful_payment(
+            db,
+            session.id,
+            {"payment_intent": session.payment_intent}
+        )
+    
+    elif event_type == "checkout.session.async_payment_failed":
+        session = event.data.object
+        await process_payment_failure(db, session.id)
+    
+    elif event_type == "checkout.session.expired":
+        session = event.data.object
+        await db.payment_transactions.update_one(
+            {"session_id": session.id},
+            {"$set": {
+                "payment_status": "expired",
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        payment_status_notifier.notify(session.id)
+    
+    elif event_type == "charge.refunded":
+        charge = event.data.object
+        refund_amount = charge.amount_refunded / 100  # Convert from cents
+        await process_refund(db, charge.payment_intent, refund_amount)
+
+
 @router.post("/webhook")
 async def stripe_webhook(
     request: Request,
@@ -148,6 +308,8 @@ async def stripe_webhook(
 ):
     """
     Handle Stripe webhooks with signature verification.
+    Verified events are queued for the webhook workers and acknowledged
+    immediately; a 500 makes Stripe redeliver if the event could not be stored.
     """
     stripe_api_key = os.environ.get("STRIPE_API_KEY")
     webhook_secret = os.environ.get("STRIPE_WEBHOOK_SECRET")
@@ -166,68 +328,32 @@ async def stripe_webhook(
             raise HTTPException(status_code=400, detail="Missing signature")
         
         try:
-            event = stripe.Webhook.construct_event(
+            stripe.Webhook.construct_event(
                 payload, stripe_signature, webhook_secret
             )
         except stripe.error.SignatureVerificationError as e:
             logger.error(f"Invalid webhook signature: {str(e)}")
             raise HTTPException(status_code=400, detail="Invalid signature")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid payload")
     else:
         # Development mode - parse without verification
         logger.warning("Webhook signature verification disabled - set STRIPE_WEBHOOK_SECRET for production")
-        try:
-            import json
-            data = json.loads(payload)
-            event = stripe.Event.construct_from(data, stripe_api_key)
-        except Exception as e:
-            logger.error(f"Failed to parse webhook: {str(e)}")
-            raise HTTPException(status_code=400, detail="Invalid payload")
     
-    db = request.app.state.db
-    event_type = event.type
+    try:
+        event = json.loads(payload)
+        event_id, event_type = event["id"], event["type"]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Failed to parse webhook: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid payload")
     
     logger.info(f"Received Stripe webhook: {event_type}")
     
-    try:
-        if event_type == "checkout.session.completed":
-            session = event.data.object
-            if session.payment_status == "paid":
-                await process_successful_payment(
-                    db, 
-                    session.id,
-                    {"payment_intent": session.payment_intent}
-                )
-        
-        elif event_type == "checkout.session.async_payment_succeeded":
-            session = event.data.object
-            await process_successful_payment(
-                db,
-                session.id,
-                {"payment_intent": session.payment_intent}
-            )
-        
-        elif event_type == "checkout.session.async_payment_failed":
-            session = event.data.object
-            await process_payment_failure(db, session.id)
-        
-        elif event_type == "checkout.session.expired":
-            session = event.data.object
-            await db.payment_transactions.update_one(
-                {"session_id": session.id},
-                {"$set": {
-                    "payment_status": "expired",
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-        
-        elif event_type == "charge.refunded":
-            charge = event.data.object
-            refund_amount = charge.amount_refunded / 100  # Convert from cents
-            await process_refund(db, charge.payment_intent, refund_amount)
-        
-        return {"success": True, "event_type": event_type}
+    db = request.app.state.db
+    queued = await enqueue_webhook_event(db, event)
+    
+    workers = getattr(request.app.state, "webhook_workers", None)
+    if queued and workers:
+        workers.wake()
     
-    except Exception as e:
-        logger.error(f"Error processing webhook {event_type}: {str(e)}")
-        # Return 200 to prevent Stripe retries for processing errors
-        return {"success": False, "error": str(e)}
+    return {"success": True, "event_type": event_type, "event_id": event_id}
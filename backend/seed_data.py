@@ -10,6 +10,9 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from utils.campaigns import student_summary
+from utils.donor_wall import rebuild_donor_wall
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -174,6 +177,7 @@ async def seed_data():
     await db.student_profiles.delete_many({})
     await db.campaigns.delete_many({})
     await db.donations.delete_many({})
+    await db.donor_walls.delete_many({})
     
     print("Seeding students, campaigns, and donations...")
     
@@ -225,6 +229,7 @@ async def seed_data():
             "timeline": campaign_data["timeline"],
             "impact_log": campaign_data["impact_log"],
             "status": campaign_data.get("status", "active"),
+            "student": student_summary(user, profile),
             "created_at": datetime.now(timezone.utc).isoformat(),
             "updated_at": datetime.now(timezone.utc).isoformat()
         }
@@ -247,6 +252,8 @@ async def seed_data():
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.donations.insert_one(donation)
+        
+        await rebuild_donor_wall(db, campaign_id)
     
     print("\nSeed data complete!")
     print(f"  - {len(SAMPLE_STUDENTS)} students")
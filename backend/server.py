@@ -7,6 +7,7 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import os
+import asyncio
 import logging
 from pathlib import Path
 from datetime import datetime, timezone
@@ -51,7 +52,14 @@ from routes.donations import router as donations_router
 from routes.admin import router as admin_router
 from routes.static_data import router as static_data_router
 from routes.uploads import router as uploads_router
-from routes.webhooks import router as webhooks_router
+from routes.webhooks import router as webhooks_router, handle_webhook_event
+from utils.auth import apply_session_renewal
+from utils.cache import cache_stats
+from utils.http_client import close_http_client, get_http_client, http_client_stats
+from utils.payment_events import payment_status_notifier
+from utils.session_tokens import revocation_list, signed_sessions_enabled, sync_revocations_periodically
+from utils.stripe_client import stripe_stats
+from utils.webhook_queue import WebhookWorkerPool
 
 # Include all routers
 api_router.include_router(auth_router)
@@ -82,9 +90,16 @@ async def health_check():
     except Exception:
         db_status = "unhealthy"
     
+    webhook_workers = getattr(app.state, "webhook_workers", None)
     return {
         "status": "healthy" if db_status == "healthy" else "degraded",
         "database": db_status,
+        "caches": cache_stats(),
+        "revocations": revocation_list.stats(),
+        "http_client": http_client_stats(),
+        "stripe": stripe_stats(),
+        "payment_status_waiters": payment_status_notifier.stats(),
+        "webhook_workers": webhook_workers.stats() if webhook_workers else None,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
@@ -97,11 +112,27 @@ app.include_router(api_router)
 @app.on_event("startup")
 async def startup_event():
     app.state.db = db
+    # Shared outbound HTTP client (OAuth, Cloudinary)
+    get_http_client()
     await create_indexes()
     await seed_initial_admin()
+    start_revocation_sync()
+    app.state.webhook_workers = WebhookWorkerPool(db, handle_webhook_event)
+    app.state.webhook_workers.start()
     logger.info("FundEd API started successfully")
 
 
+def start_revocation_sync():
+    """Keep this worker's copy of the session revocation list fresh."""
+    if os.environ.get("SESSION_MODE", "opaque") == "signed" and not signed_sessions_enabled():
+        logger.warning("SESSION_MODE=signed requires SECRET_KEY; falling back to opaque sessions")
+    if not signed_sessions_enabled():
+        return
+    
+    interval = float(os.environ.get("REVOCATION_SYNC_INTERVAL", "30"))
+    app.state.revocation_sync = asyncio.create_task(sync_revocations_periodically(db, interval))
+
+
 async def create_indexes():
     """Create MongoDB indexes for performance."""
     try:
@@ -114,19 +145,39 @@ async def create_indexes():
         await db.user_sessions.create_index("session_token", unique=True)
         await db.user_sessions.create_index("user_id")
         await db.user_sessions.create_index("expires_at", expireAfterSeconds=0)
+        await db.revoked_sessions.create_index("user_id", unique=True)
+        await db.revoked_sessions.create_index("expires_at", expireAfterSeconds=0)
         
         # Campaigns
         await db.campaigns.create_index("campaign_id", unique=True)
         await db.campaigns.create_index("student_id")
         await db.campaigns.create_index("status")
+        await db.campaigns.create_index([("status", 1), ("created_at", -1), ("campaign_id", -1)])
+        await db.campaigns.create_index([("status", 1), ("category", 1), ("created_at", -1), ("campaign_id", -1)])
+        await db.campaigns.create_index([("status", 1), ("student.country", 1), ("created_at", -1), ("campaign_id", -1)])
+        await db.campaigns.create_index([("status", 1), ("student.field_of_study", 1), ("created_at", -1), ("campaign_id", -1)])
         await db.campaigns.create_index([("title", "text"), ("story", "text")])
         
         # Donations
         await db.donations.create_index("donation_id", unique=True)
         await db.donations.create_index("campaign_id")
+        await db.donations.create_index([("campaign_id", 1), ("payment_status", 1), ("created_at", -1)])
         await db.donations.create_index("donor_id")
+        await db.donations.create_index([("payment_status", 1), ("created_at", 1)])
+        await db.donations.create_index([("donor_id", 1), ("payment_status", 1), ("created_at", -1), ("donation_id", -1)])
         await db.donations.create_index("stripe_session_id", unique=True, sparse=True)
         
+        # Donor walls
+        await db.donor_walls.create_index("campaign_id", unique=True)
+        
+        # Webhook queue
+        await db.webhook_events.create_index("event_id", unique=True)
+        await db.webhook_events.create_index([("status", 1), ("available_at", 1)])
+        await db.webhook_events.create_index("expires_at", expireAfterSeconds=0)
+        await db.webhook_dead_letters.create_index("event_id", unique=True)
+        await db.processed_events.create_index("event_id", unique=True)
+        await db.processed_events.create_index("expires_at", expireAfterSeconds=0)
+        
         # Transactions
         await db.payment_transactions.create_index("session_id", unique=True)
         await db.payment_transactions.create_index("idempotency_key", unique=True, sparse=True)
@@ -177,6 +228,13 @@ async def seed_initial_admin():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    sync_task = getattr(app.state, "revocation_sync", None)
+    if sync_task:
+        sync_task.cancel()
+    webhook_workers = getattr(app.state, "webhook_workers", None)
+    if webhook_workers:
+        await webhook_workers.stop()
+    await close_http_client()
     client.close()
     logger.info("Database connection closed")
 
@@ -217,6 +275,14 @@ else:
     )
 
 
+# Sliding session renewal
+@app.middleware("http")
+async def refresh_session_cookie(request: Request, call_next):
+    response = await call_next(request)
+    apply_session_renewal(request, response)
+    return response
+
+
 # Request validation middleware
 @app.middleware("http")
 async def validate_content_type(request: Request, call_next):
@@ -1,12 +1,113 @@
 import pytest
+import pytest_asyncio
 import os
+import uuid
+import httpx
+from datetime import datetime, timezone, timedelta
+from pymongo import monitoring
+from pymongo.errors import ServerSelectionTimeoutError
+from motor.motor_asyncio import AsyncIOMotorClient
 
 # Set test environment before importing app
 os.environ["ENVIRONMENT"] = "test"
 os.environ["MONGO_URL"] = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 os.environ["DB_NAME"] = "funded_test"
 
+# Commands issued by the driver itself rather than by request handlers
+IGNORED_COMMANDS = {"ping", "endSessions", "killCursors", "dropDatabase"}
+
+
+class QueryCounter(monitoring.CommandListener):
+    """Records the MongoDB commands sent while a test runs."""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            self.commands.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands = []
+
+    @property
+    def count(self):
+        return len(self.commands)
+
 
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture
+def query_counter():
+    return QueryCounter()
+
+
+@pytest_asyncio.fixture
+async def db(query_counter):
+    """Clean test database. Skips the test when MongoDB is not reachable."""
+    client = AsyncIOMotorClient(
+        os.environ["MONGO_URL"],
+        serverSelectionTimeoutMS=2000,
+        event_listeners=[query_counter]
+    )
+    try:
+        await client.admin.command("ping")
+    except ServerSelectionTimeoutError:
+        client.close()
+        pytest.skip("MongoDB not available")
+    
+    database = client[os.environ["DB_NAME"]]
+    await client.drop_database(os.environ["DB_NAME"])
+    query_counter.reset()
+    yield database
+    await client.drop_database(os.environ["DB_NAME"])
+    client.close()
+
+
+@pytest_asyncio.fixture
+async def client(db):
+    """In-process API client bound to the test database."""
+    from server import app
+    from utils.cache import clear_caches
+    app.state.db = db
+    clear_caches()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as api_client:
+        yield api_client
+
+
+@pytest_asyncio.fixture
+async def login(db):
+    """Factory creating a user with a live session; returns its auth headers."""
+    async def _login(role="donor", user_id=None):
+        user_id = user_id or f"user_{uuid.uuid4().hex[:12]}"
+        session_token = f"test_session_{uuid.uuid4().hex}"
+        now = datetime.now(timezone.utc)
+        await db.users.update_one(
+            {"user_id": user_id},
+            {"$setOnInsert": {
+                "user_id": user_id,
+                "email": f"{user_id}@example.com",
+                "name": f"Test {role}",
+                "role": role
+            }},
+            upsert=True
+        )
+        await db.user_sessions.insert_one({
+            "session_id": f"session_{uuid.uuid4().hex[:12]}",
+            "user_id": user_id,
+            "session_token": session_token,
+            "expires_at": now + timedelta(days=7),
+            "created_at": now
+        })
+        return {"Authorization": f"Bearer {session_token}"}
+    return _login
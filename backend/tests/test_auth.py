@@ -0,0 +1,154 @@
+"""
+Session and authentication tests.
+These tests run in-process against a real MongoDB and are skipped without one.
+"""
+from datetime import datetime, timezone, timedelta
+
+from migrate_session_dates import migrate_session_dates
+
+
+async def test_repeated_requests_use_session_cache(client, db, login, query_counter):
+    """Only the first authenticated request looks up the session and user."""
+    headers = await login()
+    
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    
+    query_counter.reset()
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert query_counter.count == 0
+
+
+async def test_logout_invalidates_cached_session(client, db, login):
+    headers = await login()
+    await client.get("/api/auth/me", headers=headers)
+    
+    response = await client.post("/api/auth/logout", headers=headers)
+    assert response.status_code == 200
+    
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 401
+
+
+async def test_role_change_is_visible_immediately(client, db, login):
+    headers = await login(user_id="user_rolechange")
+    admin_headers = await login(role="admin")
+    await client.get("/api/auth/me", headers=headers)
+    
+    response = await client.put(
+        "/api/admin/users/user_rolechange/role",
+        json={"role": "institution"},
+        headers=admin_headers
+    )
+    assert response.status_code == 200
+    
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.json()["data"]["role"] == "institution"
+
+
+async def test_deleted_user_loses_access(client, db, login):
+    headers = await login(user_id="user_tobedeleted")
+    admin_headers = await login(role="admin")
+    await client.get("/api/auth/me", headers=headers)
+    
+    response = await client.delete("/api/admin/users/user_tobedeleted", headers=admin_headers)
+    assert response.status_code == 200
+    
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 401
+
+
+async def test_sessions_are_stored_with_date_expiry(client, db, login):
+    headers = await login(user_id="user_dates")
+    
+    session = await db.user_sessions.find_one({"user_id": "user_dates"})
+    assert isinstance(session["expires_at"], datetime)
+    
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+
+
+async def test_expired_session_is_rejected_without_cleanup_write(client, db, login, query_counter):
+    headers = await login(user_id="user_expired")
+    await db.user_sessions.update_one(
+        {"user_id": "user_expired"},
+        {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(minutes=1)}}
+    )
+    
+    query_counter.reset()
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert ("delete", "user_sessions") not in query_counter.commands
+
+
+async def test_migration_converts_string_session_dates(db):
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    await db.user_sessions.insert_many([
+        {"session_token": "legacy", "user_id": "user_a", "expires_at": expires_at.isoformat(), "created_at": "2024-01-01T00:00:00+00:00"},
+        {"session_token": "current", "user_id": "user_b", "expires_at": expires_at, "created_at": expires_at}
+    ])
+    
+    assert await migrate_session_dates(db) == 1
+    
+    legacy = await db.user_sessions.find_one({"session_token": "legacy"})
+    assert isinstance(legacy["expires_at"], datetime)
+    assert isinstance(legacy["created_at"], datetime)
+    assert await migrate_session_dates(db) == 0
+
+
+async def _age_session(db, user_id, remaining):
+    await db.user_sessions.update_one(
+        {"user_id": user_id},
+        {"$set": {"expires_at": datetime.now(timezone.utc) + remaining}}
+    )
+
+
+async def test_fresh_session_is_not_renewed(client, db, login, query_counter):
+    headers = await login()
+    
+    query_counter.reset()
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert ("update", "user_sessions") not in query_counter.commands
+    assert "set-cookie" not in response.headers
+
+
+async def test_aging_session_is_renewed_once(client, db, login, query_counter):
+    headers = await login(user_id="user_sliding")
+    await _age_session(db, "user_sliding", timedelta(days=1))
+    client.cookies.set("session_token", headers["Authorization"].replace("Bearer ", ""))
+    
+    response = await client.get("/api/auth/me")
+    assert response.status_code == 200
+    
+    session = await db.user_sessions.find_one({"user_id": "user_sliding"})
+    assert session["expires_at"].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc) + timedelta(days=6)
+    
+    query_counter.reset()
+    await client.get("/api/auth/me")
+    assert ("update", "user_sessions") not in query_counter.commands
+
+
+async def test_bearer_session_is_not_renewed(client, db, login, query_counter):
+    headers = await login(user_id="user_bearer")
+    await _age_session(db, "user_bearer", timedelta(days=1))
+    
+    query_counter.reset()
+    for _ in range(2):
+        response = await client.get("/api/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert "set-cookie" not in response.headers
+    assert ("update", "user_sessions") not in query_counter.commands
+
+
+async def test_renewal_refreshes_session_cookie(client, db, login):
+    headers = await login(user_id="user_cookie")
+    await _age_session(db, "user_cookie", timedelta(days=1))
+    token = headers["Authorization"].replace("Bearer ", "")
+    client.cookies.set("session_token", token)
+    
+    response = await client.get("/api/auth/me")
+    assert response.status_code == 200
+    assert f"session_token={token}" in response.headers["set-cookie"]
+    assert "Max-Age=604800" in response.headers["set-cookie"]
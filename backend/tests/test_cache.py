@@ -0,0 +1,48 @@
+"""
+Unit tests for the in-process TTL/LRU cache.
+"""
+import time
+
+from utils.cache import TTLCache, cache_stats
+
+
+def test_get_counts_hits_and_misses():
+    cache = TTLCache(name="test_counts", maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(name="test_lru", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(name="test_ttl", maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate_tag_drops_only_tagged_entries():
+    cache = TTLCache(name="test_tags", maxsize=10, ttl=60)
+    cache.set("page1", 1, tags=["campaign_a", "campaign_b"])
+    cache.set("page2", 2, tags=["campaign_c"])
+    cache.invalidate_tag("campaign_b")
+    assert cache.get("page1") is None
+    assert cache.get("page2") == 2
+
+
+def test_registered_caches_report_stats():
+    TTLCache(name="test_registry", maxsize=5, ttl=60)
+    assert cache_stats()["test_registry"]["maxsize"] == 5
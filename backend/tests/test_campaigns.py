@@ -0,0 +1,414 @@
+"""
+Campaign listing tests.
+These tests run in-process against a real MongoDB and are skipped without one.
+"""
+from datetime import datetime, timezone, timedelta
+
+from utils.cache import clear_caches
+from utils.campaigns import student_summary
+
+
+async def seed_campaigns(db, count, country="Kenya", field_of_study="Computer Science", category="tuition"):
+    """Insert `count` students, profiles and active campaigns."""
+    now = datetime.now(timezone.utc)
+    users, profiles, campaigns = [], [], []
+    for i in range(count):
+        user_id = f"user_{country[:3].lower()}{i:04d}"
+        users.append({
+            "user_id": user_id,
+            "email": f"{user_id}@example.com",
+            "name": f"Student {i}",
+            "picture": None,
+            "role": "student"
+        })
+        profiles.append({
+            "user_id": user_id,
+            "country": country,
+            "field_of_study": field_of_study,
+            "university": "Test University",
+            "verification_status": "verified"
+        })
+        campaigns.append({
+            "campaign_id": f"campaign_{country[:3].lower()}{i:04d}",
+            "student_id": user_id,
+            "title": f"Campaign {i}",
+            "story": "Help me study",
+            "category": category,
+            "target_amount": 1000.0,
+            "raised_amount": 0.0,
+            "donor_count": 0,
+            "timeline": "6 months",
+            "status": "active",
+            "student": student_summary(users[-1], profiles[-1]),
+            "created_at": (now - timedelta(minutes=i)).isoformat(),
+            "updated_at": (now - timedelta(minutes=i)).isoformat()
+        })
+    await db.users.insert_many(users)
+    await db.student_profiles.insert_many(profiles)
+    await db.campaigns.insert_many(campaigns)
+    await db.donor_walls.insert_many([{"campaign_id": c["campaign_id"], "entries": []} for c in campaigns])
+
+
+async def test_list_campaigns_includes_student_summary(client, db):
+    """Each listed campaign carries the joined student summary."""
+    await seed_campaigns(db, 3)
+    
+    response = await client.get("/api/campaigns")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pagination"]["total"] == 3
+    student = data["data"][0]["student"]
+    assert student["name"].startswith("Student")
+    assert student["country"] == "Kenya"
+    assert student["verification_status"] == "verified"
+
+
+async def test_list_campaigns_query_count_is_constant(client, db, query_counter):
+    """A page costs the same number of round trips regardless of its size."""
+    await seed_campaigns(db, 50)
+    
+    query_counter.reset()
+    response = await client.get("/api/campaigns", params={"limit": 5})
+    assert response.status_code == 200
+    small_page = query_counter.count
+    
+    clear_caches()
+    query_counter.reset()
+    response = await client.get("/api/campaigns", params={"limit": 50})
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 50
+    assert query_counter.count == small_page
+    assert query_counter.count <= 2
+
+
+async def test_list_campaigns_filtered_query_count_is_constant(client, db, query_counter):
+    """Country and field filters do not add per-row lookups."""
+    await seed_campaigns(db, 20)
+    
+    query_counter.reset()
+    response = await client.get(
+        "/api/campaigns",
+        params={"country": "Kenya", "field_of_study": "Computer Science", "limit": 20}
+    )
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 20
+    assert query_counter.count <= 2
+
+
+async def test_filtered_pages_are_full_and_total_is_exact(client, db):
+    """Country filtering happens before pagination."""
+    await seed_campaigns(db, 15, country="India")
+    await seed_campaigns(db, 10, country="Kenya")
+    
+    response = await client.get("/api/campaigns", params={"country": "Kenya", "limit": 4, "page": 1})
+    data = response.json()
+    assert len(data["data"]) == 4
+    assert all(c["student"]["country"] == "Kenya" for c in data["data"])
+    assert data["pagination"]["total"] == 10
+    assert data["pagination"]["total_pages"] == 3
+    
+    response = await client.get("/api/campaigns", params={"country": "Kenya", "limit": 4, "page": 3})
+    assert len(response.json()["data"]) == 2
+
+
+async def test_backfill_copies_profile_attributes(db):
+    """The backfill command stamps the student summary onto old campaigns."""
+    from backfill_campaigns import backfill_campaigns
+    
+    await seed_campaigns(db, 3, country="Brazil")
+    await db.campaigns.update_many({}, {"$unset": {"student": ""}})
+    
+    await backfill_campaigns(db)
+    
+    campaign = await db.campaigns.find_one({}, {"_id": 0})
+    assert campaign["student"]["country"] == "Brazil"
+    assert campaign["student"]["name"].startswith("Student")
+    assert campaign["student"]["verification_status"] == "verified"
+
+
+async def test_cursor_pagination_walks_every_campaign_once(client, db):
+    """Following next_cursor visits each campaign exactly once."""
+    await seed_campaigns(db, 11)
+    
+    seen = []
+    params = {"limit": 4}
+    while True:
+        response = await client.get("/api/campaigns", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(c["campaign_id"] for c in data["data"])
+        if not data["pagination"]["next_cursor"]:
+            break
+        params["cursor"] = data["pagination"]["next_cursor"]
+    
+    assert len(seen) == 11
+    assert len(set(seen)) == 11
+
+
+async def test_cursor_is_stable_under_concurrent_inserts(client, db):
+    """Campaigns created between page fetches do not shift later pages."""
+    await seed_campaigns(db, 6)
+    
+    first = (await client.get("/api/campaigns", params={"limit": 3})).json()
+    await seed_campaigns(db, 2, country="Canada")
+    second = (await client.get(
+        "/api/campaigns",
+        params={"limit": 3, "cursor": first["pagination"]["next_cursor"]}
+    )).json()
+    
+    first_ids = {c["campaign_id"] for c in first["data"]}
+    second_ids = {c["campaign_id"] for c in second["data"]}
+    assert not first_ids & second_ids
+    assert len(second_ids) == 3
+
+
+async def test_invalid_cursor_is_rejected(client, db):
+    response = await client.get("/api/campaigns", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+async def test_search_ranks_by_text_relevance(client, db):
+    """Searches use the text index and return the relevance score."""
+    await seed_campaigns(db, 3)
+    await db.campaigns.create_index([("title", "text"), ("story", "text")])
+    await db.campaigns.update_one(
+        {"campaign_id": "campaign_ken0002"},
+        {"$set": {"title": "Robotics robotics lab", "story": "Robotics club equipment"}}
+    )
+    await db.campaigns.update_one(
+        {"campaign_id": "campaign_ken0001"},
+        {"$set": {"story": "Some robotics"}}
+    )
+    
+    response = await client.get("/api/campaigns", params={"search": "robotics"})
+    data = response.json()["data"]
+    assert [c["campaign_id"] for c in data] == ["campaign_ken0002", "campaign_ken0001"]
+    assert data[0]["score"] > data[1]["score"]
+
+
+async def test_short_search_is_escaped_prefix_match(client, db):
+    """Short queries fall back to an anchored, escaped title prefix match."""
+    await seed_campaigns(db, 2)
+    await db.campaigns.update_one({"campaign_id": "campaign_ken0000"}, {"$set": {"title": "(C) Course"}})
+    
+    response = await client.get("/api/campaigns", params={"search": "(c"})
+    assert response.status_code == 200
+    assert [c["campaign_id"] for c in response.json()["data"]] == ["campaign_ken0000"]
+
+
+async def test_list_pages_are_cached(client, db, query_counter):
+    """Repeated identical list requests are served without queries."""
+    await seed_campaigns(db, 3)
+    
+    await client.get("/api/campaigns", params={"category": "tuition"})
+    query_counter.reset()
+    response = await client.get("/api/campaigns", params={"category": "tuition"})
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 3
+    assert query_counter.count == 0
+
+
+async def test_donation_invalidates_cached_page(client, db):
+    """A processed payment drops cached pages showing that campaign."""
+    from routes.webhooks import process_successful_payment
+    
+    await seed_campaigns(db, 2)
+    await client.get("/api/campaigns")
+    await db.payment_transactions.insert_one({
+        "session_id": "cs_test_1",
+        "campaign_id": "campaign_ken0000",
+        "donor_name": "Donor",
+        "amount": 25.0,
+        "payment_status": "initiated"
+    })
+    
+    await process_successful_payment(db, "cs_test_1", {"payment_intent": "pi_1"})
+    
+    data = (await client.get("/api/campaigns")).json()["data"]
+    campaign = next(c for c in data if c["campaign_id"] == "campaign_ken0000")
+    assert campaign["raised_amount"] == 25.0
+
+
+async def test_total_is_capped_unless_exact_requested(client, db, monkeypatch):
+    """Large totals are capped and flagged as inexact."""
+    monkeypatch.setattr("routes.campaigns.CAMPAIGN_COUNT_CAP", 3)
+    await seed_campaigns(db, 5)
+    
+    pagination = (await client.get("/api/campaigns")).json()["pagination"]
+    assert pagination["total"] == 3
+    assert pagination["total_exact"] is False
+    
+    pagination = (await client.get("/api/campaigns", params={"exact_total": "true"})).json()["pagination"]
+    assert pagination["total"] == 5
+    assert pagination["total_exact"] is True
+
+
+async def test_total_is_reused_across_pages(client, db, query_counter):
+    """Later pages with the same filters reuse the cached total."""
+    await seed_campaigns(db, 6)
+    
+    await client.get("/api/campaigns", params={"limit": 2, "page": 1})
+    query_counter.reset()
+    response = await client.get("/api/campaigns", params={"limit": 2, "page": 2})
+    assert response.json()["pagination"]["total"] == 6
+    assert query_counter.count <= 1
+
+
+async def test_campaign_detail_reads_two_documents(client, db, query_counter):
+    """The detail page reads the campaign and its donor wall, nothing else."""
+    await seed_campaigns(db, 1)
+    
+    query_counter.reset()
+    response = await client.get("/api/campaigns/campaign_ken0000")
+    data = response.json()["data"]
+    assert data["student"]["name"] == "Student 0"
+    assert data["student"]["university"] == "Test University"
+    assert {name for name, _ in query_counter.commands} <= {"find"}
+    assert sorted(collection for _, collection in query_counter.commands) == ["campaigns", "donor_walls"]
+
+
+async def test_verification_refreshes_embedded_summary(client, db, login):
+    """Verifying a student updates the summary on their campaigns."""
+    await seed_campaigns(db, 1)
+    await db.student_profiles.update_one({"user_id": "user_ken0000"}, {"$set": {"verification_status": "pending"}})
+    admin_headers = await login(role="admin")
+    
+    response = await client.put(
+        "/api/admin/students/user_ken0000/verify",
+        json={"action": "reject"},
+        headers=admin_headers
+    )
+    assert response.status_code == 200
+    
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_ken0000"}, {"_id": 0})
+    assert campaign["student"]["verification_status"] == "rejected"
+
+
+async def test_campaign_detail_supports_conditional_get(client, db, query_counter):
+    """A matching If-None-Match returns 304 without reading donations."""
+    await seed_campaigns(db, 1)
+    
+    response = await client.get("/api/campaigns/campaign_ken0000")
+    etag = response.headers["etag"]
+    
+    query_counter.reset()
+    response = await client.get("/api/campaigns/campaign_ken0000", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert {collection for _, collection in query_counter.commands} == {"campaigns"}
+
+
+async def test_campaign_etag_changes_after_donation(client, db):
+    """New donations change the validator so clients refetch the donor wall."""
+    from routes.webhooks import process_successful_payment
+    
+    await seed_campaigns(db, 1)
+    etag = (await client.get("/api/campaigns/campaign_ken0000")).headers["etag"]
+    await db.payment_transactions.insert_one({
+        "session_id": "cs_test_etag",
+        "campaign_id": "campaign_ken0000",
+        "donor_name": "Donor",
+        "amount": 10.0,
+        "payment_status": "initiated"
+    })
+    await process_successful_payment(db, "cs_test_etag", {"payment_intent": "pi_etag"})
+    
+    response = await client.get("/api/campaigns/campaign_ken0000", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()["data"]["donors"]) == 1
+
+
+async def test_donor_wall_is_maintained_by_webhooks(client, db):
+    """Payments push onto the materialized wall; refunds rebuild it."""
+    from routes.webhooks import process_successful_payment, process_refund
+    
+    await seed_campaigns(db, 1)
+    for i, (name, anonymous) in enumerate([("Ada", False), ("Bob", True), ("Cy", False)]):
+        await db.payment_transactions.insert_one({
+            "session_id": f"cs_wall_{i}",
+            "campaign_id": "campaign_ken0000",
+            "donor_name": name,
+            "amount": 10.0 + i,
+            "anonymous": anonymous,
+            "payment_status": "initiated"
+        })
+        await process_successful_payment(db, f"cs_wall_{i}", {"payment_intent": f"pi_wall_{i}"})
+    
+    wall = (await client.get("/api/donations/campaign/campaign_ken0000")).json()["data"]
+    assert [entry["name"] for entry in wall] == ["Cy", "Anonymous", "Ada"]
+    
+    await process_refund(db, "pi_wall_2", 12.0)
+    wall = (await client.get("/api/campaigns/campaign_ken0000")).json()["data"]["donors"]
+    assert [entry["name"] for entry in wall] == ["Anonymous", "Ada"]
+
+
+async def test_first_push_builds_missing_wall_from_donations(client, db):
+    """A campaign without a wall document gets one with its older donors too."""
+    from routes.webhooks import process_successful_payment
+    
+    await seed_campaigns(db, 1)
+    await db.donor_walls.delete_many({})
+    await db.donations.insert_one({
+        "donation_id": "donation_old",
+        "campaign_id": "campaign_ken0000",
+        "donor_name": "Early",
+        "amount": 5.0,
+        "payment_status": "paid",
+        "created_at": "2020-01-01T00:00:00+00:00"
+    })
+    await db.payment_transactions.insert_one({
+        "session_id": "cs_wall_new",
+        "campaign_id": "campaign_ken0000",
+        "donor_name": "Late",
+        "amount": 10.0,
+        "payment_status": "initiated"
+    })
+    await process_successful_payment(db, "cs_wall_new", {"payment_intent": "pi_wall_new"})
+    
+    wall = (await client.get("/api/campaigns/campaign_ken0000")).json()["data"]["donors"]
+    assert [entry["name"] for entry in wall] == ["Late", "Early"]
+
+
+async def test_facets_count_active_campaigns(client, db):
+    """Facet counts cover active campaigns only, in one aggregation."""
+    await seed_campaigns(db, 3, country="Kenya")
+    await seed_campaigns(db, 2, country="India", category="books")
+    await db.campaigns.update_one({"campaign_id": "campaign_ind0000"}, {"$set": {"status": "cancelled"}})
+    
+    data = (await client.get("/api/campaigns/facets")).json()["data"]
+    assert data["countries"] == [{"value": "Kenya", "count": 3}, {"value": "India", "count": 1}]
+    assert data["categories"] == [{"value": "tuition", "count": 3}, {"value": "books", "count": 1}]
+    assert data["fields_of_study"] == [{"value": "Computer Science", "count": 4}]
+
+
+async def test_facets_are_adjusted_on_status_change(client, db, login, query_counter):
+    """Status changes update the cached counts without a recount."""
+    await seed_campaigns(db, 2)
+    await client.get("/api/campaigns/facets")
+    admin_headers = await login(role="admin")
+    
+    response = await client.put(
+        "/api/admin/campaigns/campaign_ken0000/status",
+        json={"status": "suspended"},
+        headers=admin_headers
+    )
+    assert response.status_code == 200
+    
+    query_counter.reset()
+    data = (await client.get("/api/campaigns/facets")).json()["data"]
+    assert data["countries"] == [{"value": "Kenya", "count": 1}]
+    assert query_counter.count == 0
+
+
+async def test_summary_refresh_updates_facet_counts(client, db):
+    """A student's new country is reflected in the cached facet counts."""
+    from utils.campaigns import refresh_student_summary
+    
+    await seed_campaigns(db, 2)
+    await client.get("/api/campaigns/facets")
+    
+    await db.student_profiles.update_one({"user_id": "user_ken0000"}, {"$set": {"country": "Uganda"}})
+    await refresh_student_summary(db, "user_ken0000")
+    
+    data = (await client.get("/api/campaigns/facets")).json()["data"]
+    assert sorted(bucket["value"] for bucket in data["countries"]) == ["Kenya", "Uganda"]
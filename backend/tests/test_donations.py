@@ -0,0 +1,461 @@
+"""
+Donation checkout tests.
+Stripe is replaced by a local stand-in server; these tests need MongoDB.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import stripe
+
+from utils import stripe_client
+
+
+class StripeStandIn(BaseHTTPRequestHandler):
+    """Answers checkout session creation like Stripe, after a delay."""
+    delay = 0.0
+    idempotency_keys = []
+    success_urls = []
+    
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        self.idempotency_keys.append(self.headers.get("Idempotency-Key"))
+        self.success_urls.extend(form.get("success_url", []))
+        time.sleep(self.delay)
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        body = json.dumps({
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.test/{session_id}"
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stripe_stand_in(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StripeStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    monkeypatch.setenv("STRIPE_API_KEY", "sk_test_stand_in")
+    monkeypatch.setattr(stripe, "api_base", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(stripe, "max_network_retries", 0)
+    monkeypatch.setattr(StripeStandIn, "delay", 0.0)
+    monkeypatch.setattr(StripeStandIn, "idempotency_keys", [])
+    monkeypatch.setattr(StripeStandIn, "success_urls", [])
+    # Slots are bound to the event loop of the test using them
+    monkeypatch.setattr(stripe_client, "_slots", asyncio.Semaphore(stripe_client.STRIPE_MAX_CONCURRENCY))
+    yield StripeStandIn
+    
+    server.shutdown()
+    server.server_close()
+
+
+async def seed_campaign(db, campaign_id="campaign_checkout"):
+    now = datetime.now(timezone.utc).isoformat()
+    await db.campaigns.insert_one({
+        "campaign_id": campaign_id,
+        "student_id": "user_student",
+        "title": "Checkout Campaign",
+        "story": "Help me study",
+        "category": "tuition",
+        "target_amount": 1000.0,
+        "raised_amount": 0.0,
+        "donor_count": 0,
+        "status": "active",
+        "created_at": now,
+        "updated_at": now
+    })
+
+
+def checkout_body(campaign_id="campaign_checkout", **overrides):
+    body = {
+        "campaign_id": campaign_id,
+        "amount": 25,
+        "origin_url": "http://localhost:3000",
+        "idempotency_key": f"key_{uuid.uuid4().hex}"
+    }
+    body.update(overrides)
+    return body
+
+
+async def test_checkout_creates_session_and_transaction(client, db, stripe_stand_in):
+    await seed_campaign(db)
+    
+    response = await client.post("/api/donations/checkout", json=checkout_body())
+    assert response.status_code == 200
+    session_id = response.json()["data"]["session_id"]
+    assert session_id.startswith("cs_test_")
+    assert await db.payment_transactions.find_one({"session_id": session_id})
+
+
+async def test_checkout_burst_does_not_block_other_requests(client, db, stripe_stand_in):
+    """Load test: other endpoints stay fast while many checkouts wait on Stripe."""
+    await seed_campaign(db)
+    stripe_stand_in.delay = 0.5
+    
+    async def checkout():
+        return await client.post("/api/donations/checkout", json=checkout_body())
+    
+    # Warm up the Stripe SDK and its worker threads
+    await asyncio.gather(*[checkout() for _ in range(stripe_client.STRIPE_MAX_CONCURRENCY)])
+    
+    async def probe_latencies():
+        # Includes any time the event loop was blocked between probes
+        latencies = []
+        for _ in range(20):
+            started = time.perf_counter()
+            response = await client.get("/api/categories")
+            assert response.status_code == 200
+            await asyncio.sleep(0.02)
+            latencies.append(time.perf_counter() - started - 0.02)
+        return latencies
+    
+    started = time.perf_counter()
+    burst = [checkout() for _ in range(2 * stripe_client.STRIPE_MAX_CONCURRENCY)]
+    latencies, *responses = await asyncio.gather(probe_latencies(), *burst)
+    elapsed = time.perf_counter() - started
+    
+    assert all(response.status_code == 200 for response in responses)
+    # A blocking Stripe call would stall the probe for a full round trip
+    assert max(latencies) < stripe_stand_in.delay / 2
+    # Two waves of concurrent calls, not twenty sequential ones
+    assert elapsed < 6 * stripe_stand_in.delay
+
+
+async def test_slow_stripe_call_times_out(client, db, stripe_stand_in, monkeypatch):
+    await seed_campaign(db)
+    stripe_stand_in.delay = 0.5
+    monkeypatch.setattr(stripe_client, "STRIPE_TIMEOUT", 0.1)
+    
+    response = await client.post("/api/donations/checkout", json=checkout_body())
+    assert response.status_code == 504
+    assert stripe_client.stripe_stats()["timeouts"] >= 1
+
+
+
+async def test_parallel_identical_checkouts_create_one_session(client, db, stripe_stand_in):
+    await seed_campaign(db)
+    stripe_stand_in.delay = 0.2
+    body = checkout_body(idempotency_key="key_parallel")
+    
+    responses = await asyncio.gather(*[
+        client.post("/api/donations/checkout", json=body) for _ in range(8)
+    ])
+    
+    assert all(response.status_code == 200 for response in responses)
+    session_ids = {response.json()["data"]["session_id"] for response in responses}
+    assert len(session_ids) == 1
+    assert stripe_stand_in.idempotency_keys == ["key_parallel"]
+    assert await db.payment_transactions.count_documents({"idempotency_key": "key_parallel"}) == 1
+
+
+async def test_repeated_checkout_is_a_single_query(client, db, stripe_stand_in, query_counter):
+    await seed_campaign(db)
+    body = checkout_body()
+    first = await client.post("/api/donations/checkout", json=body)
+    
+    query_counter.reset()
+    again = await client.post("/api/donations/checkout", json=body)
+    assert again.json()["data"] == first.json()["data"]
+    assert query_counter.commands == [("findAndModify", "payment_transactions")]
+
+
+async def test_failed_checkout_releases_its_key(client, db, stripe_stand_in):
+    body = checkout_body(idempotency_key="key_retry")
+    
+    response = await client.post("/api/donations/checkout", json=body)
+    assert response.status_code == 404
+    assert not await db.payment_transactions.find_one({"idempotency_key": "key_retry"})
+    
+    await seed_campaign(db)
+    response = await client.post("/api/donations/checkout", json=body)
+    assert response.status_code == 200
+
+
+async def test_stale_checkout_reservation_is_taken_over(client, db, stripe_stand_in):
+    await seed_campaign(db)
+    # A reservation left behind by a request that died before Stripe answered
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_abandoned",
+        "idempotency_key": "key_abandoned",
+        "session_id": "pending_txn_abandoned",
+        "campaign_id": "campaign_checkout",
+        "donor_id": None,
+        "donor_name": "Donor",
+        "donor_email": None,
+        "amount": 25.0,
+        "anonymous": False,
+        "payment_status": "initiated",
+        "checkout_url": None,
+        "origin_url": "https://funded.test",
+        "reserved_at": datetime.now(timezone.utc) - timedelta(seconds=stripe_client.STRIPE_TIMEOUT + 1)
+    })
+    
+    started = time.perf_counter()
+    response = await client.post("/api/donations/checkout", json=checkout_body(idempotency_key="key_abandoned"))
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 2
+    assert stripe_stand_in.idempotency_keys == ["key_abandoned"]
+    # Same parameters as the abandoned request, so Stripe accepts the reused key
+    assert stripe_stand_in.success_urls[0].startswith("https://funded.test/donate/success")
+    
+    transaction = await db.payment_transactions.find_one({"idempotency_key": "key_abandoned"})
+    assert transaction["transaction_id"] == "txn_abandoned"
+    assert transaction["session_id"] == response.json()["data"]["session_id"]
+    assert transaction["checkout_url"]
+
+
+async def test_waiter_claims_key_released_by_failed_holder(client, db, stripe_stand_in):
+    await seed_campaign(db)
+    # A live reservation whose holder is about to fail and release the key
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_failing",
+        "idempotency_key": "key_released",
+        "session_id": "pending_txn_failing",
+        "campaign_id": "campaign_checkout",
+        "checkout_url": None,
+        "reserved_at": datetime.now(timezone.utc)
+    })
+    
+    async def release():
+        await asyncio.sleep(0.2)
+        await db.payment_transactions.delete_one({"transaction_id": "txn_failing"})
+    
+    response, _ = await asyncio.gather(
+        client.post("/api/donations/checkout", json=checkout_body(idempotency_key="key_released")),
+        release()
+    )
+    assert response.status_code == 200
+    assert stripe_stand_in.idempotency_keys == ["key_released"]
+    transaction = await db.payment_transactions.find_one({"idempotency_key": "key_released"})
+    assert transaction["checkout_url"]
+
+
+async def test_checkout_caches_campaign_eligibility(client, db, stripe_stand_in, query_counter):
+    await seed_campaign(db)
+    await client.post("/api/donations/checkout", json=checkout_body())
+    
+    query_counter.reset()
+    response = await client.post("/api/donations/checkout", json=checkout_body())
+    assert response.status_code == 200
+    assert ("find", "campaigns") not in query_counter.commands
+
+
+async def test_status_change_invalidates_eligibility(client, db, stripe_stand_in, login):
+    await seed_campaign(db)
+    admin_headers = await login(role="admin")
+    await client.post("/api/donations/checkout", json=checkout_body())
+    
+    response = await client.put(
+        "/api/admin/campaigns/campaign_checkout/status",
+        json={"status": "suspended"},
+        headers=admin_headers
+    )
+    assert response.status_code == 200
+    
+    response = await client.post("/api/donations/checkout", json=checkout_body())
+    assert response.status_code == 400
+
+
+async def seed_donations(db, donor_id, count, campaigns=3):
+    now = datetime.now(timezone.utc)
+    for i in range(campaigns):
+        await seed_campaign(db, f"campaign_history{i}")
+    await db.donations.insert_many([
+        {
+            "donation_id": f"donation_{i:04d}",
+            "campaign_id": f"campaign_history{i % campaigns}",
+            "donor_id": donor_id,
+            "donor_name": "Donor",
+            "amount": 10.0,
+            "payment_status": "paid",
+            "created_at": (now - timedelta(minutes=i)).isoformat()
+        }
+        for i in range(count)
+    ])
+
+
+async def test_my_donations_uses_one_campaign_query(client, db, login, query_counter):
+    headers = await login(user_id="user_donor")
+    await seed_donations(db, "user_donor", 30)
+    await client.get("/api/auth/me", headers=headers)
+    
+    query_counter.reset()
+    response = await client.get("/api/donations/my", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["data"]) == 20
+    assert data["data"][0]["campaign"]["title"] == "Checkout Campaign"
+    assert "story" not in data["data"][0]["campaign"]
+    assert query_counter.commands.count(("find", "campaigns")) == 1
+    assert data["summary"] == {"total_donated": 300.0, "donation_count": 30, "campaign_count": 3}
+
+
+async def test_my_donations_cursor_walks_full_history(client, db, login):
+    headers = await login(user_id="user_heavy")
+    await seed_donations(db, "user_heavy", 130)
+    
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 50, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/donations/my", params=params, headers=headers)
+        data = response.json()
+        seen.extend(d["donation_id"] for d in data["data"])
+        assert ("summary" in data) == (cursor is None)
+        cursor = data["pagination"]["next_cursor"]
+        if not cursor:
+            break
+    
+    assert len(seen) == 130
+    assert seen == sorted(seen)
+
+
+async def test_export_streams_csv_with_filters(client, db, login):
+    headers = await login(user_id="user_exporter")
+    await seed_donations(db, "user_exporter", 12)
+    
+    response = await client.get(
+        "/api/donations/my/export",
+        params={"format": "csv", "campaign_id": "campaign_history0"},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("donation_id,created_at,campaign_id")
+    assert len(lines) == 1 + 4
+
+
+async def test_csv_export_escapes_formulas(client, db, login):
+    import csv
+    import io
+    await seed_donations(db, "user_someone", 3, campaigns=1)
+    names = ['=HYPERLINK("http://evil.test","click")', "@SUM(A1)", "Ada"]
+    for i, name in enumerate(names):
+        await db.donations.update_one({"donation_id": f"donation_{i:04d}"}, {"$set": {"donor_name": name}})
+    
+    response = await client.get(
+        "/api/admin/donations/export",
+        params={"format": "csv"},
+        headers=await login(role="admin")
+    )
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    # Oldest first, so the last seeded donation comes first
+    assert [row["donor_name"] for row in rows] == [
+        "Ada", "'@SUM(A1)", "'=HYPERLINK(\"http://evil.test\",\"click\")"
+    ]
+    assert rows[0]["amount"] == "10.0"
+
+
+async def test_export_streams_ndjson_in_batches(client, db, login, monkeypatch):
+    from utils import exports
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 7)
+    headers = await login(user_id="user_exporter")
+    await seed_donations(db, "user_exporter", 30)
+    start = (datetime.now(timezone.utc) - timedelta(minutes=19, seconds=30)).isoformat()
+    
+    response = await client.get(
+        "/api/donations/my/export",
+        params={"format": "ndjson", "start": start},
+        headers=headers
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 20
+    assert [row["created_at"] for row in rows] == sorted(row["created_at"] for row in rows)
+
+
+async def test_admin_export_requires_admin(client, db, login):
+    await seed_donations(db, "user_someone", 5)
+    
+    response = await client.get("/api/admin/donations/export", headers=await login())
+    assert response.status_code == 403
+    
+    response = await client.get(
+        "/api/admin/donations/export",
+        params={"format": "ndjson"},
+        headers=await login(role="admin")
+    )
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 5
+
+
+async def test_export_rejects_bad_parameters(client, db, login):
+    headers = await login()
+    
+    response = await client.get("/api/donations/my/export", params={"format": "xml"}, headers=headers)
+    assert response.status_code == 400
+    response = await client.get("/api/donations/my/export", params={"start": "yesterday"}, headers=headers)
+    assert response.status_code == 400
+
+
+async def seed_transaction(db, session_id, payment_status="initiated"):
+    await db.payment_transactions.insert_one({
+        "transaction_id": f"txn_{session_id}",
+        "session_id": session_id,
+        "campaign_id": "campaign_checkout",
+        "donor_name": "Donor",
+        "amount": 25.0,
+        "payment_status": payment_status
+    })
+
+
+async def test_status_wait_returns_when_webhook_settles_payment(client, db):
+    from routes.webhooks import process_payment_failure
+    await seed_transaction(db, "cs_wait")
+    
+    async def settle():
+        await asyncio.sleep(0.1)
+        await process_payment_failure(db, "cs_wait")
+    
+    started = time.perf_counter()
+    response, _ = await asyncio.gather(
+        client.get("/api/donations/status/cs_wait", params={"wait": 5}),
+        settle()
+    )
+    assert response.json()["data"]["payment_status"] == "failed"
+    assert time.perf_counter() - started < 2
+
+
+async def test_status_wait_is_bounded(client, db, query_counter, monkeypatch):
+    await seed_transaction(db, "cs_pending")
+    
+    query_counter.reset()
+    started = time.perf_counter()
+    response = await client.get("/api/donations/status/cs_pending", params={"wait": 0.2})
+    assert response.json()["data"]["payment_status"] == "initiated"
+    assert 0.2 <= time.perf_counter() - started < 2
+    assert query_counter.count == 1
+    
+    # Waits above the configured maximum are clamped rather than rejected
+    monkeypatch.setattr("routes.donations.PAYMENT_STATUS_MAX_WAIT", 0.2)
+    started = time.perf_counter()
+    response = await client.get("/api/donations/status/cs_pending", params={"wait": 600})
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 2
+    
+    response = await client.get("/api/donations/status/cs_pending", params={"wait": -1})
+    assert response.status_code == 422
+
+
+async def test_settled_status_returns_without_waiting(client, db):
+    await seed_transaction(db, "cs_paid", payment_status="paid")
+    
+    started = time.perf_counter()
+    response = await client.get("/api/donations/status/cs_paid", params={"wait": 5})
+    assert response.json()["data"]["payment_status"] == "paid"
+    assert time.perf_counter() - started < 1
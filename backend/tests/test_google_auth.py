@@ -0,0 +1,112 @@
+"""
+Google ID token verification tests.
+Tokens are signed with locally generated keys; no network access is needed.
+"""
+import json
+import time
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+from utils.google_auth import GoogleKeySet, verify_google_id_token
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+def _generate_key(key_id):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    public_jwk.update({"kid": key_id, "alg": "RS256", "use": "sig"})
+    return private_key, public_jwk
+
+
+class LocalKeySet(GoogleKeySet):
+    """Key set served from memory, counting fetches."""
+    
+    def __init__(self, *public_jwks):
+        super().__init__()
+        self.public_jwks = list(public_jwks)
+        self.fetches = 0
+    
+    async def fetch(self):
+        self.fetches += 1
+        return {"keys": self.public_jwks}, 3600
+
+
+def _id_token(private_key, key_id, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "student@example.com",
+        "name": "Test Student",
+        "picture": "https://example.com/picture.png",
+        "iat": now,
+        "exp": now + 3600
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": key_id})
+
+
+async def test_valid_token_returns_claims_and_caches_keys():
+    private_key, public_jwk = _generate_key("key-1")
+    key_set = LocalKeySet(public_jwk)
+    
+    for _ in range(3):
+        claims = await verify_google_id_token(_id_token(private_key, "key-1"), CLIENT_ID, key_set)
+        assert claims["email"] == "student@example.com"
+    
+    assert key_set.fetches == 1
+
+
+async def test_rotated_key_triggers_refetch():
+    old_key, old_jwk = _generate_key("key-old")
+    new_key, new_jwk = _generate_key("key-new")
+    key_set = LocalKeySet(old_jwk)
+    await verify_google_id_token(_id_token(old_key, "key-old"), CLIENT_ID, key_set)
+    
+    # Google publishes the new key; cached keys have not expired yet
+    key_set.public_jwks = [old_jwk, new_jwk]
+    key_set._fetched_at -= 120
+    
+    claims = await verify_google_id_token(_id_token(new_key, "key-new"), CLIENT_ID, key_set)
+    assert claims["sub"] == "1234567890"
+    assert key_set.fetches == 2
+
+
+async def test_unknown_key_ids_do_not_refetch_repeatedly():
+    private_key, public_jwk = _generate_key("key-1")
+    key_set = LocalKeySet(public_jwk)
+    await verify_google_id_token(_id_token(private_key, "key-1"), CLIENT_ID, key_set)
+    
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            await verify_google_id_token(_id_token(private_key, "key-bogus"), CLIENT_ID, key_set)
+        assert exc.value.status_code == 400
+    
+    assert key_set.fetches == 1
+
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "someone-else.apps.googleusercontent.com"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 60}
+])
+async def test_invalid_claims_are_rejected(overrides):
+    private_key, public_jwk = _generate_key("key-1")
+    key_set = LocalKeySet(public_jwk)
+    
+    with pytest.raises(HTTPException) as exc:
+        await verify_google_id_token(_id_token(private_key, "key-1", **overrides), CLIENT_ID, key_set)
+    assert exc.value.status_code == 400
+
+
+async def test_token_signed_by_another_key_is_rejected():
+    _, public_jwk = _generate_key("key-1")
+    forged_key, _ = _generate_key("key-1")
+    key_set = LocalKeySet(public_jwk)
+    
+    with pytest.raises(HTTPException):
+        await verify_google_id_token(_id_token(forged_key, "key-1"), CLIENT_ID, key_set)
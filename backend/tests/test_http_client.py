@@ -0,0 +1,82 @@
+"""
+Shared outbound HTTP client tests, run against an in-memory transport.
+"""
+import httpx
+import pytest
+
+from utils import http_client
+from utils.http_client import create_http_client, http_request, timeout_for
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_RETRY_BACKOFF", 0)
+
+
+def _client(*outcomes):
+    """Client whose transport replays `outcomes` (status codes or exceptions) in order."""
+    calls = []
+
+    def handler(request):
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(request)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"ok": outcome == 200})
+
+    return create_http_client(transport=httpx.MockTransport(handler)), calls
+
+
+async def test_idempotent_request_retries_gateway_errors():
+    client, calls = _client(503, 502, 200)
+
+    response = await http_request("GET", "https://example.com/keys", client=client)
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+async def test_retries_are_bounded():
+    client, calls = _client(503)
+
+    response = await http_request("GET", "https://example.com/keys", client=client)
+    assert response.status_code == 503
+    assert len(calls) == http_client.HTTP_RETRIES + 1
+
+
+async def test_post_is_not_retried_after_it_was_sent():
+    client, calls = _client(503, 200)
+    response = await http_request("POST", "https://example.com/token", client=client)
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+    client, calls = _client(httpx.ReadTimeout("timed out"), 200)
+    with pytest.raises(httpx.ReadTimeout):
+        await http_request("POST", "https://example.com/token", client=client)
+    assert len(calls) == 1
+
+
+async def test_post_is_retried_when_connection_failed():
+    client, calls = _client(httpx.ConnectError("refused"), 200)
+
+    response = await http_request("POST", "https://example.com/token", client=client)
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+async def test_post_marked_idempotent_is_retried():
+    client, calls = _client(504, 200)
+
+    response = await http_request("POST", "https://example.com/destroy", client=client, idempotent=True)
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_per_host_timeouts():
+    assert timeout_for("https://api.cloudinary.com/v1_1/demo/image/upload").read == 60.0
+    assert timeout_for("https://example.com/") == http_client.DEFAULT_TIMEOUT
+
+
+async def test_health_reports_client_stats(client):
+    response = await client.get("/api/health")
+    stats = response.json()["http_client"]
+    assert {"requests", "retries", "failures", "max_connections"} <= stats.keys()
@@ -0,0 +1,98 @@
+"""
+Signed session token tests.
+Token tests run without a database; request tests need MongoDB.
+"""
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from utils.session_tokens import (
+    issue_signed_token,
+    looks_signed,
+    revocation_list,
+    verify_signed_token
+)
+
+USER = {"user_id": "user_signed", "role": "donor", "email": "signed@example.com", "name": "Signed"}
+
+
+@pytest.fixture(autouse=True)
+def signed_mode(monkeypatch):
+    monkeypatch.setenv("SESSION_MODE", "signed")
+    monkeypatch.setenv("SECRET_KEY", "test-secret-key-for-signed-sessions")
+    revocation_list._revoked_at.clear()
+    yield
+    revocation_list._revoked_at.clear()
+
+
+def _expires_in(seconds):
+    return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+
+def test_signed_token_round_trip():
+    token = issue_signed_token(USER, _expires_in(60))
+    
+    assert looks_signed(token)
+    user = verify_signed_token(token)
+    assert user["user_id"] == "user_signed"
+    assert user["role"] == "donor"
+
+
+def test_tampered_or_foreign_tokens_are_rejected(monkeypatch):
+    token = issue_signed_token(USER, _expires_in(60))
+    header, payload, signature = token.split(".")
+    assert verify_signed_token(f"{header}.{payload}.{signature[::-1]}") is None
+    
+    monkeypatch.setenv("SECRET_KEY", "another-secret-key-for-signed-sessions")
+    assert verify_signed_token(token) is None
+
+
+def test_expired_token_is_rejected():
+    token = issue_signed_token(USER, _expires_in(-60))
+    assert verify_signed_token(token) is None
+
+
+def test_opaque_tokens_are_not_mistaken_for_signed():
+    assert not looks_signed("test_session_0123456789abcdef")
+
+
+async def test_signed_session_needs_no_queries(client, db, query_counter):
+    await db.users.insert_one(dict(USER))
+    headers = {"Authorization": f"Bearer {issue_signed_token(USER, _expires_in(60))}"}
+    
+    query_counter.reset()
+    response = await client.get("/api/campaigns/my", headers=headers)
+    assert response.status_code == 403
+    assert ("find", "user_sessions") not in query_counter.commands
+    assert ("find", "users") not in query_counter.commands
+
+
+async def test_logout_revokes_signed_token(client, db):
+    await db.users.insert_one(dict(USER))
+    headers = {"Authorization": f"Bearer {issue_signed_token(USER, _expires_in(60))}"}
+    
+    response = await client.post("/api/auth/logout", headers=headers)
+    assert response.status_code == 200
+    
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert await db.revoked_sessions.find_one({"user_id": "user_signed"})
+
+
+async def test_revocations_sync_between_workers(db):
+    await revocation_list.revoke(db, "user_signed")
+    revocation_list._revoked_at.clear()
+    
+    await revocation_list.sync(db)
+    assert revocation_list.is_revoked("user_signed", 0)
+
+
+async def test_aging_signed_token_is_reissued(client, db):
+    token = issue_signed_token(USER, _expires_in(24 * 60 * 60))
+    client.cookies.set("session_token", token)
+    
+    response = await client.get("/api/auth/me")
+    assert response.status_code == 200
+    
+    renewed = response.cookies.get("session_token")
+    assert renewed and renewed != token
+    assert verify_signed_token(renewed)["user_id"] == "user_signed"
@@ -0,0 +1,417 @@
+"""
+Stripe webhook queue tests. These need MongoDB.
+"""
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from routes.webhooks import handle_webhook_event
+from utils import webhook_queue
+from utils.webhook_queue import WebhookWorkerPool
+
+
+def stripe_event(event_id, event_type="checkout.session.async_payment_failed", session_id="cs_queued"):
+    return {
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "data": {"object": {"id": session_id, "object": "checkout.session"}}
+    }
+
+
+@pytest.fixture(autouse=True)
+def stripe_key(monkeypatch):
+    monkeypatch.setenv("STRIPE_API_KEY", "sk_test_webhooks")
+    monkeypatch.delenv("STRIPE_WEBHOOK_SECRET", raising=False)
+
+
+async def test_webhook_is_queued_and_acknowledged(client, db):
+    await db.webhook_events.create_index("event_id", unique=True)
+    response = await client.post("/api/stripe/webhook", json=stripe_event("evt_ack"))
+    assert response.status_code == 200
+    assert response.json()["event_id"] == "evt_ack"
+    
+    queued = await db.webhook_events.find_one({"event_id": "evt_ack"})
+    assert queued["status"] == "pending"
+    assert queued["payload"]["type"] == "checkout.session.async_payment_failed"
+    
+    # Redeliveries are acknowledged without queueing the event twice
+    response = await client.post("/api/stripe/webhook", json=stripe_event("evt_ack"))
+    assert response.status_code == 200
+    assert await db.webhook_events.count_documents({"event_id": "evt_ack"}) == 1
+
+
+async def test_webhook_rejects_malformed_payload(client, db):
+    response = await client.post("/api/stripe/webhook", content=b"not json")
+    assert response.status_code == 400
+    assert await db.webhook_events.count_documents({}) == 0
+
+
+async def test_worker_applies_queued_event(client, db):
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_queued",
+        "session_id": "cs_queued",
+        "payment_status": "initiated"
+    })
+    await client.post("/api/stripe/webhook", json=stripe_event("evt_apply"))
+    
+    pool = WebhookWorkerPool(db, handle_webhook_event)
+    assert await pool.process_next("worker-test") is True
+    assert await pool.process_next("worker-test") is False
+    
+    transaction = await db.payment_transactions.find_one({"session_id": "cs_queued"})
+    assert transaction["payment_status"] == "failed"
+    queued = await db.webhook_events.find_one({"event_id": "evt_apply"})
+    assert queued["status"] == "done"
+    assert "locked_by" not in queued
+    assert pool.stats()["processed"] == 1
+
+
+async def test_failing_event_is_retried_then_dead_lettered(db, monkeypatch):
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_MAX_ATTEMPTS", 3)
+    
+    async def failing_handler(db, payload):
+        raise RuntimeError("handler failed")
+    
+    await webhook_queue.enqueue_webhook_event(db, stripe_event("evt_poison"))
+    pool = WebhookWorkerPool(db, failing_handler)
+    
+    assert await pool.process_next("worker-test") is True
+    queued = await db.webhook_events.find_one({"event_id": "evt_poison"})
+    assert queued["status"] == "pending"
+    assert queued["last_error"] == "handler failed"
+    available_at = queued["available_at"].replace(tzinfo=timezone.utc)
+    assert available_at > datetime.now(timezone.utc)
+    
+    # Backed off events are not claimed early
+    assert await pool.process_next("worker-test") is False
+    
+    for _ in range(2):
+        await db.webhook_events.update_one(
+            {"event_id": "evt_poison"},
+            {"$set": {"available_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        assert await pool.process_next("worker-test") is True
+    
+    assert await db.webhook_events.count_documents({"event_id": "evt_poison"}) == 0
+    dead_letter = await db.webhook_dead_letters.find_one({"event_id": "evt_poison"})
+    assert dead_letter["attempts"] == 3
+    assert dead_letter["payload"]["id"] == "evt_poison"
+    assert pool.stats() == {"processed": 0, "retried": 2, "dead_lettered": 1, "workers": 0}
+
+
+async def test_expired_lease_is_reclaimed(db):
+    await webhook_queue.enqueue_webhook_event(db, stripe_event("evt_lease"))
+    claimed = await webhook_queue.claim_webhook_event(db, "worker-crashed")
+    assert claimed["locked_by"] == "worker-crashed"
+    assert await webhook_queue.claim_webhook_event(db, "worker-other") is None
+    
+    await db.webhook_events.update_one(
+        {"event_id": "evt_lease"},
+        {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+    reclaimed = await webhook_queue.claim_webhook_event(db, "worker-other")
+    assert reclaimed["locked_by"] == "worker-other"
+    assert reclaimed["attempts"] == 2
+
+
+async def seed_payment(db, session_id, amount, campaign_id="campaign_goal"):
+    await db.payment_transactions.insert_one({
+        "transaction_id": f"txn_{session_id}",
+        "session_id": session_id,
+        "campaign_id": campaign_id,
+        "donor_name": "Donor",
+        "amount": amount,
+        "payment_status": "initiated"
+    })
+
+
+async def test_payment_completes_campaign_in_one_write(db, query_counter):
+    from routes.webhooks import process_successful_payment
+    await db.donations.create_index("stripe_session_id", unique=True, sparse=True)
+    await db.campaigns.insert_one({
+        "campaign_id": "campaign_goal",
+        "status": "active",
+        "raised_amount": 90.0,
+        "target_amount": 100.0,
+        "donor_count": 3
+    })
+    await db.donor_walls.insert_one({"campaign_id": "campaign_goal", "entries": []})
+    await seed_payment(db, "cs_goal", 10.0)
+    
+    query_counter.reset()
+    await process_successful_payment(db, "cs_goal", {"payment_intent": "pi_goal"})
+    assert query_counter.commands == [
+        ("findAndModify", "payment_transactions"),
+        ("insert", "donations"),
+        ("update", "donor_walls"),
+        ("findAndModify", "campaigns")
+    ]
+    
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_goal"})
+    assert campaign["status"] == "completed"
+    assert campaign["raised_amount"] == 100.0
+    assert campaign["donor_count"] == 4
+    
+    # A redelivered payment is not counted twice
+    await process_successful_payment(db, "cs_goal", {"payment_intent": "pi_goal"})
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_goal"})
+    assert campaign["raised_amount"] == 100.0
+    assert await db.donations.count_documents({"stripe_session_id": "cs_goal"}) == 1
+
+
+async def test_payment_resumes_after_failed_campaign_write(db, monkeypatch):
+    import routes.webhooks
+    from routes.webhooks import process_successful_payment
+    await db.donations.create_index("stripe_session_id", unique=True, sparse=True)
+    await db.campaigns.insert_one({
+        "campaign_id": "campaign_goal",
+        "status": "active",
+        "raised_amount": 0.0,
+        "target_amount": 100.0
+    })
+    await seed_payment(db, "cs_partial_write", 30.0)
+    
+    campaign_payment_update = routes.webhooks._campaign_payment_update
+    
+    def failing_update(*args):
+        monkeypatch.setattr(routes.webhooks, "_campaign_payment_update", campaign_payment_update)
+        raise RuntimeError("campaign write failed")
+    
+    monkeypatch.setattr(routes.webhooks, "_campaign_payment_update", failing_update)
+    with pytest.raises(RuntimeError):
+        await process_successful_payment(db, "cs_partial_write", {"payment_intent": "pi_partial_write"})
+    assert await db.donations.count_documents({"stripe_session_id": "cs_partial_write"}) == 1
+    
+    # The queue redelivers; the retry finishes the campaign write once
+    for _ in range(2):
+        await process_successful_payment(db, "cs_partial_write", {"payment_intent": "pi_partial_write"})
+    
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_goal"})
+    assert campaign["raised_amount"] == 30.0
+    assert campaign["donor_count"] == 1
+    assert campaign["applied_sessions"] == ["cs_partial_write"]
+    wall = await db.donor_walls.find_one({"campaign_id": "campaign_goal"})
+    assert len(wall["entries"]) == 1
+
+
+async def test_concurrent_deliveries_count_payment_once(db):
+    from routes.webhooks import process_successful_payment
+    await db.donations.create_index("stripe_session_id", unique=True, sparse=True)
+    await db.campaigns.insert_one({
+        "campaign_id": "campaign_goal",
+        "status": "active",
+        "raised_amount": 0.0,
+        "target_amount": 100.0
+    })
+    await seed_payment(db, "cs_twice", 15.0)
+    
+    await asyncio.gather(*[
+        process_successful_payment(db, "cs_twice", {"payment_intent": "pi_twice"})
+        for _ in range(3)
+    ])
+    # A retry after the campaign write landed, e.g. following a crash
+    await db.donations.delete_many({"stripe_session_id": "cs_twice"})
+    await db.donations.insert_one({"stripe_session_id": "cs_twice", "campaign_id": "campaign_goal"})
+    await process_successful_payment(db, "cs_twice", {"payment_intent": "pi_twice"})
+    
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_goal"})
+    assert campaign["raised_amount"] == 15.0
+    assert campaign["donor_count"] == 1
+
+
+async def test_applied_sessions_are_not_exposed(client, db):
+    await db.campaigns.insert_one({
+        "campaign_id": "campaign_goal",
+        "status": "active",
+        "raised_amount": 15.0,
+        "target_amount": 100.0,
+        "applied_sessions": ["cs_secret"],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    
+    detail = (await client.get("/api/campaigns/campaign_goal")).json()["data"]
+    assert "applied_sessions" not in detail
+    listing = (await client.get("/api/campaigns")).json()["data"]
+    assert [campaign["campaign_id"] for campaign in listing] == ["campaign_goal"]
+    assert "applied_sessions" not in listing[0]
+
+
+async def test_payment_below_target_keeps_campaign_active(db):
+    from routes.webhooks import process_successful_payment, _completed_by_payment
+    await db.campaigns.insert_one({
+        "campaign_id": "campaign_goal",
+        "status": "active",
+        "raised_amount": 0.0,
+        "target_amount": 100.0
+    })
+    await seed_payment(db, "cs_partial", 40.0)
+    
+    await process_successful_payment(db, "cs_partial", {"payment_intent": "pi_partial"})
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_goal"})
+    assert campaign["status"] == "active"
+    assert campaign["donor_count"] == 1
+    
+    assert _completed_by_payment({"status": "completed", "raised_amount": 110.0, "target_amount": 100.0}, 20.0)
+    assert not _completed_by_payment({"status": "completed", "raised_amount": 120.0, "target_amount": 100.0}, 20.0)
+
+
+async def test_redelivered_event_is_applied_once(db):
+    await db.processed_events.create_index("event_id", unique=True)
+    await db.campaigns.insert_one({"campaign_id": "campaign_goal", "raised_amount": 50.0, "donor_count": 2})
+    await db.donations.insert_one({
+        "donation_id": "donation_refund",
+        "campaign_id": "campaign_goal",
+        "amount": 20.0,
+        "payment_status": "paid",
+        "stripe_payment_intent": "pi_refund"
+    })
+    refund = {
+        "id": "evt_refund",
+        "object": "event",
+        "type": "charge.refunded",
+        "data": {"object": {"object": "charge", "payment_intent": "pi_refund", "amount_refunded": 2000}}
+    }
+    
+    await handle_webhook_event(db, refund)
+    await handle_webhook_event(db, refund)
+    
+    campaign = await db.campaigns.find_one({"campaign_id": "campaign_goal"})
+    assert campaign["raised_amount"] == 30.0
+    assert campaign["donor_count"] == 1
+    assert await db.processed_events.count_documents({"event_id": "evt_refund"}) == 1
+
+
+async def test_redelivery_is_skipped_in_one_command(db, query_counter):
+    await db.processed_events.create_index("event_id", unique=True)
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_queued",
+        "session_id": "cs_queued",
+        "payment_status": "initiated"
+    })
+    await handle_webhook_event(db, stripe_event("evt_twice"))
+    
+    query_counter.reset()
+    await handle_webhook_event(db, stripe_event("evt_twice"))
+    assert query_counter.commands == [("findAndModify", "processed_events")]
+    marker = await db.processed_events.find_one({"event_id": "evt_twice"})
+    assert marker["status"] == "done"
+    assert "owner" not in marker
+
+
+async def test_unrecorded_event_is_dead_lettered_not_replayed(db, monkeypatch):
+    import routes.webhooks
+    from pymongo.errors import AutoReconnect
+    await db.processed_events.create_index("event_id", unique=True)
+    await db.webhook_events.create_index("event_id", unique=True)
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_queued",
+        "session_id": "cs_queued",
+        "payment_status": "initiated"
+    })
+    attempts = []
+    
+    class UnreachableMarkers:
+        async def update_one(self, *args, **kwargs):
+            attempts.append(args)
+            raise AutoReconnect("MongoDB unreachable")
+    
+    class MarkerOutage:
+        processed_events = UnreachableMarkers()
+    
+    async def finish_during_outage(db, event_id, owner, retry_for=0):
+        await webhook_queue.finish_event_processing(MarkerOutage(), event_id, owner, retry_for=retry_for)
+    
+    monkeypatch.setattr(routes.webhooks, "WEBHOOK_LEASE_SECONDS", 0.5)
+    monkeypatch.setattr(routes.webhooks, "finish_event_processing", finish_during_outage)
+    await webhook_queue.enqueue_webhook_event(db, stripe_event("evt_unrecorded"))
+    pool = WebhookWorkerPool(db, handle_webhook_event)
+    assert await pool.process_next("worker-test") is True
+    
+    # The marker write was retried, then the applied event went to review
+    assert len(attempts) > 1
+    assert pool.stats()["dead_lettered"] == 1
+    assert await db.webhook_events.count_documents({"event_id": "evt_unrecorded"}) == 0
+    dead_letter = await db.webhook_dead_letters.find_one({"event_id": "evt_unrecorded"})
+    assert "could not be recorded" in dead_letter["last_error"]
+    transaction = await db.payment_transactions.find_one({"session_id": "cs_queued"})
+    assert transaction["payment_status"] == "failed"
+
+
+async def test_failed_event_is_not_marked_processed(db, monkeypatch):
+    import routes.webhooks
+    await db.processed_events.create_index("event_id", unique=True)
+    
+    async def failing_failure(db, session_id):
+        raise RuntimeError("write failed")
+    
+    monkeypatch.setattr(routes.webhooks, "process_payment_failure", failing_failure)
+    with pytest.raises(RuntimeError):
+        await handle_webhook_event(db, stripe_event("evt_unmarked"))
+    assert await db.processed_events.count_documents({"event_id": "evt_unmarked"}) == 0
+
+
+async def test_event_marked_by_crashed_worker_is_still_applied(db):
+    await db.processed_events.create_index("event_id", unique=True)
+    await db.webhook_events.create_index("event_id", unique=True)
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_queued",
+        "session_id": "cs_queued",
+        "payment_status": "initiated"
+    })
+    await webhook_queue.enqueue_webhook_event(db, stripe_event("evt_crash"))
+    
+    # A worker claims the event and marks it, then dies before applying it
+    await webhook_queue.claim_webhook_event(db, "worker-crashed")
+    assert await webhook_queue.begin_event_processing(db, "evt_crash", None, "worker-crashed")
+    
+    # While its lease is live another delivery is retried, not skipped
+    with pytest.raises(webhook_queue.EventInProgressError):
+        await handle_webhook_event(db, stripe_event("evt_crash"))
+    
+    expired = {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    await db.webhook_events.update_one({"event_id": "evt_crash"}, expired)
+    await db.processed_events.update_one({"event_id": "evt_crash"}, expired)
+    
+    pool = WebhookWorkerPool(db, handle_webhook_event)
+    assert await pool.process_next("worker-other") is True
+    assert pool.stats()["processed"] == 1
+    
+    transaction = await db.payment_transactions.find_one({"session_id": "cs_queued"})
+    assert transaction["payment_status"] == "failed"
+    marker = await db.processed_events.find_one({"event_id": "evt_crash"})
+    assert marker["status"] == "done"
+    
+    # Once done, redeliveries are skipped
+    await handle_webhook_event(db, stripe_event("evt_crash"))
+    assert await db.processed_events.count_documents({"event_id": "evt_crash"}) == 1
+
+
+async def test_marker_survives_unreachable_database(db):
+    import routes.webhooks
+    await db.processed_events.create_index("event_id", unique=True)
+    
+    async def unreachable(*args, **kwargs):
+        raise RuntimeError("MongoDB unreachable")
+    
+    # The handler and the lease release both fail, leaving the marker behind
+    with pytest.MonkeyPatch.context() as outage:
+        outage.setattr(routes.webhooks, "process_payment_failure", unreachable)
+        outage.setattr(routes.webhooks, "release_event_processing", unreachable)
+        with pytest.raises(RuntimeError):
+            await handle_webhook_event(db, stripe_event("evt_outage"))
+    
+    await db.payment_transactions.insert_one({
+        "transaction_id": "txn_queued",
+        "session_id": "cs_queued",
+        "payment_status": "initiated"
+    })
+    await db.processed_events.update_one(
+        {"event_id": "evt_outage"},
+        {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+    await handle_webhook_event(db, stripe_event("evt_outage"))
+    
+    transaction = await db.payment_transactions.find_one({"session_id": "cs_queued"})
+    assert transaction["payment_status"] == "failed"
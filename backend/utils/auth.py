@@ -1,6 +1,129 @@
-from fastapi import Request, HTTPException
+from fastapi import Request, HTTPException, Response
 from typing import Optional
 from datetime import datetime, timezone
+import hashlib
+import os
+import secrets
+import uuid
+
+from models.session import UserSession
+from utils.cache import TTLCache
+from utils.session_tokens import (
+    SIGNED_SESSION_LIFETIME,
+    decode_signed_token,
+    issue_signed_token,
+    looks_signed,
+    revocation_list,
+    signed_sessions_enabled,
+    user_from_claims
+)
+
+SESSION_LIFETIME = SIGNED_SESSION_LIFETIME
+
+# Sessions are extended once this fraction of their lifetime has passed,
+# so an active session is written at most once per such interval
+SESSION_RENEW_FRACTION = float(os.environ.get("SESSION_RENEW_FRACTION", "0.5"))
+
+# Resolved sessions keyed by token hash, tagged by user_id for invalidation
+session_cache = TTLCache(
+    name="sessions",
+    maxsize=int(os.environ.get("SESSION_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("SESSION_CACHE_TTL", "60"))
+)
+
+
+def _session_cache_key(session_token: str) -> str:
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+
+async def invalidate_user_sessions(db, user_id: str) -> None:
+    """
+    Drop cached sessions of a user after their sessions or account change.
+    Signed tokens embed the role, so they are revoked outright.
+    """
+    session_cache.invalidate_tag(user_id)
+    if signed_sessions_enabled():
+        await revocation_list.revoke(db, user_id)
+
+
+async def create_session(db, user: dict) -> str:
+    """Issue a session token for `user`: signed if enabled, else a stored opaque token."""
+    expires_at = datetime.now(timezone.utc) + SESSION_LIFETIME
+    
+    if signed_sessions_enabled():
+        return issue_signed_token(user, expires_at)
+    
+    # Generate secure session token
+    session_token = secrets.token_urlsafe(64)
+    session = UserSession(
+        session_id=f"session_{uuid.uuid4().hex[:12]}",
+        user_id=user["user_id"],
+        session_token=session_token,
+        expires_at=expires_at
+    )
+    # Stored as dates (not ISO strings) so the TTL index can expire them
+    await db.user_sessions.insert_one(session.model_dump())
+    return session_token
+
+
+def _renewed_expiry() -> datetime:
+    # MongoDB keeps millisecond precision; truncate so cached values match stored ones
+    expires_at = datetime.now(timezone.utc) + SESSION_LIFETIME
+    return expires_at.replace(microsecond=expires_at.microsecond // 1000 * 1000)
+
+
+def _renewal_due(expires_at: datetime) -> bool:
+    remaining = expires_at - datetime.now(timezone.utc)
+    return remaining < SESSION_LIFETIME * (1 - SESSION_RENEW_FRACTION)
+
+
+async def _renew_session(request: Request, db, session_token: str, expires_at: datetime) -> datetime:
+    """Slide a stored session's expiry forward; returns the new expiry."""
+    renewed_at = _renewed_expiry()
+    # Matching on the old expiry lets only one concurrent request write the renewal
+    await db.user_sessions.update_one(
+        {"session_token": session_token, "expires_at": expires_at},
+        {"$set": {"expires_at": renewed_at}}
+    )
+    request.state.renewed_session_token = session_token
+    return renewed_at
+
+
+def set_session_cookie(response: Response, session_token: str) -> None:
+    # Determine cookie settings based on environment
+    is_production = os.environ.get("ENVIRONMENT", "development") == "production"
+    
+    response.set_cookie(
+        key="session_token",
+        value=session_token,
+        httponly=True,
+        secure=is_production,
+        samesite="lax" if not is_production else "none",
+        path="/",
+        max_age=int(SESSION_LIFETIME.total_seconds())
+    )
+
+
+def apply_session_renewal(request: Request, response: Response) -> None:
+    """Refresh the session cookie when the request renewed its session."""
+    session_token = getattr(request.state, "renewed_session_token", None)
+    if not session_token:
+        return
+    # Login and logout set the cookie themselves
+    if any(header.startswith("session_token=") for header in response.headers.getlist("set-cookie")):
+        return
+    set_session_cookie(response, session_token)
+
+
+def clear_session_cookie(response: Response) -> None:
+    is_production = os.environ.get("ENVIRONMENT", "development") == "production"
+    
+    response.delete_cookie(
+        key="session_token",
+        path="/",
+        secure=is_production,
+        samesite="lax" if not is_production else "none"
+    )
 
 
 async def get_current_user(request: Request, db) -> Optional[dict]:
@@ -12,6 +135,8 @@ async def get_current_user(request: Request, db) -> Optional[dict]:
     
     # Check cookie first
     session_token = request.cookies.get("session_token")
+    # Renewed sessions are delivered as a cookie, so only cookie sessions slide
+    renewable = bool(session_token)
     
     # Fallback to Authorization header
     if not session_token:
@@ -22,26 +147,39 @@ async def get_current_user(request: Request, db) -> Optional[dict]:
     if not session_token:
         return None
     
-    # Find session in database
+    # Signed tokens are verified without touching the database
+    if looks_signed(session_token):
+        claims = decode_signed_token(session_token) if signed_sessions_enabled() else None
+        if not claims:
+            return None
+        user = user_from_claims(claims)
+        if renewable and _renewal_due(datetime.fromtimestamp(claims["exp"], timezone.utc)):
+            request.state.renewed_session_token = issue_signed_token(user, _renewed_expiry())
+        return user
+    
+    # Serve recently resolved sessions from memory
+    cache_key = _session_cache_key(session_token)
+    cached = session_cache.get(cache_key)
+    if cached is not None:
+        cached_expires_at, cached_user = cached
+        if cached_expires_at >= datetime.now(timezone.utc):
+            if renewable and _renewal_due(cached_expires_at):
+                cached_expires_at = await _renew_session(request, db, session_token, cached_expires_at)
+                session_cache.set(cache_key, (cached_expires_at, cached_user), tags=[cached_user["user_id"]])
+            return dict(cached_user)
+        session_cache.delete(cache_key)
+    
+    # Find a live session; expired ones are reaped by the TTL index
     session_doc = await db.user_sessions.find_one(
-        {"session_token": session_token},
-        {"_id": 0}
+        {"session_token": session_token, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0, "user_id": 1, "expires_at": 1}
     )
     
     if not session_doc:
         return None
     
-    # Check expiry
-    expires_at = session_doc.get("expires_at")
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    
-    if expires_at < datetime.now(timezone.utc):
-        # Session expired, clean it up
-        await db.user_sessions.delete_one({"session_token": session_token})
-        return None
+    # The driver returns naive UTC datetimes
+    expires_at = session_doc["expires_at"].replace(tzinfo=timezone.utc)
     
     # Get user
     user_doc = await db.users.find_one(
@@ -49,6 +187,11 @@ async def get_current_user(request: Request, db) -> Optional[dict]:
         {"_id": 0}
     )
     
+    if user_doc:
+        if renewable and _renewal_due(expires_at):
+            expires_at = await _renew_session(request, db, session_token, expires_at)
+        session_cache.set(cache_key, (expires_at, user_doc), tags=[user_doc["user_id"]])
+        return dict(user_doc)
     return user_doc
 
 
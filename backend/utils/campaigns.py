@@ -0,0 +1,193 @@
+from typing import Optional
+from datetime import datetime, timezone
+import os
+
+from utils.cache import TTLCache
+
+# Rendered public list pages, keyed by normalized query parameters
+campaign_list_cache = TTLCache(
+    name="campaign_list",
+    maxsize=int(os.environ.get("CAMPAIGN_LIST_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("CAMPAIGN_LIST_CACHE_TTL", "30"))
+)
+
+# Total counts per filter signature; short-lived since only totals go stale
+campaign_count_cache = TTLCache(
+    name="campaign_count",
+    maxsize=int(os.environ.get("CAMPAIGN_COUNT_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("CAMPAIGN_COUNT_CACHE_TTL", "60"))
+)
+
+# Totals above this are reported as capped unless an exact count is requested
+CAMPAIGN_COUNT_CAP = int(os.environ.get("CAMPAIGN_COUNT_CAP", "1000"))
+
+# Active-campaign counts per browse facet, adjusted in place on campaign writes
+campaign_facets_cache = TTLCache(
+    name="campaign_facets",
+    maxsize=1,
+    ttl=float(os.environ.get("CAMPAIGN_FACETS_CACHE_TTL", "300"))
+)
+
+# Status, title and target read by checkout, keyed by campaign_id
+campaign_eligibility_cache = TTLCache(
+    name="campaign_eligibility",
+    maxsize=int(os.environ.get("CAMPAIGN_ELIGIBILITY_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("CAMPAIGN_ELIGIBILITY_CACHE_TTL", "15"))
+)
+
+ELIGIBILITY_PROJECTION = {"_id": 0, "status": 1, "title": 1, "target_amount": 1}
+
+# Full campaign reads; applied_sessions is payment bookkeeping, not API data
+CAMPAIGN_PROJECTION = {"_id": 0, "applied_sessions": 0}
+
+# Facet name -> campaign field it counts
+FACET_FIELDS = {
+    "categories": "category",
+    "countries": "student.country",
+    "fields_of_study": "student.field_of_study"
+}
+
+# Summary fields left out of list pages (shown on the detail page only)
+LIST_HIDDEN_STUDENT_FIELDS = ["user_id", "email", "verification_documents"]
+
+
+def student_summary(user: Optional[dict], profile: Optional[dict]) -> dict:
+    """
+    Student summary stored on campaign documents, so campaign reads and
+    browse filters are answered from the campaigns collection alone.
+    Kept in sync by refresh_student_summary.
+    """
+    user = user or {}
+    profile = profile or {}
+    return {
+        "user_id": user.get("user_id"),
+        "name": user.get("name") or "Unknown",
+        "email": user.get("email"),
+        "picture": user.get("picture"),
+        "country": profile.get("country"),
+        "field_of_study": profile.get("field_of_study"),
+        "university": profile.get("university"),
+        "verification_status": profile.get("verification_status"),
+        "verification_documents": profile.get("verification_documents", [])
+    }
+
+
+async def refresh_student_summary(db, user_id: str) -> None:
+    """Rewrite the embedded student summary on all of a student's campaigns."""
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
+    profile = await db.student_profiles.find_one({"user_id": user_id}, {"_id": 0})
+    
+    result = await db.campaigns.update_many(
+        {"student_id": user_id},
+        {"$set": {
+            "student": student_summary(user, profile),
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }}
+    )
+    if result.modified_count:
+        invalidate_campaign_listings()
+        # The student's country and field of study are facet values; summary
+        # refreshes are rare, so recount rather than adjust per campaign
+        campaign_facets_cache.delete("active")
+
+
+def invalidate_campaign_listings(campaign_id: Optional[str] = None) -> None:
+    """
+    Drop cached list pages after a campaign write.
+    With `campaign_id`, only pages showing that campaign are dropped; use
+    this for changes that cannot move it between pages (e.g. raised_amount).
+    Without it, every page and cached total is dropped.
+    """
+    if campaign_id:
+        campaign_list_cache.invalidate_tag(campaign_id)
+    else:
+        campaign_list_cache.clear()
+        campaign_count_cache.clear()
+
+
+async def get_campaign_eligibility(db, campaign_id: str) -> Optional[dict]:
+    """Status, title and target of a campaign, or None if it does not exist."""
+    eligibility = campaign_eligibility_cache.get(campaign_id)
+    if eligibility is None:
+        eligibility = await db.campaigns.find_one({"campaign_id": campaign_id}, ELIGIBILITY_PROJECTION)
+        if eligibility is None:
+            return None
+        campaign_eligibility_cache.set(campaign_id, eligibility)
+    return dict(eligibility)
+
+
+def invalidate_campaign_eligibility(campaign_id: str) -> None:
+    """Drop a campaign's cached eligibility after its status or title changes."""
+    campaign_eligibility_cache.delete(campaign_id)
+
+
+async def count_campaigns(db, query: dict, cap: Optional[int] = None) -> tuple:
+    """
+    Count campaigns matching `query`, stopping early at `cap`.
+    Returns (total, is_exact).
+    """
+    if cap is None:
+        return await db.campaigns.count_documents(query), True
+    
+    total = await db.campaigns.count_documents(query, limit=cap + 1)
+    if total > cap:
+        return cap, False
+    return total, True
+
+
+def _facet_values(campaign: Optional[dict]) -> dict:
+    """Facet values a campaign contributes to; none unless it is active."""
+    if not campaign or campaign.get("status") != "active":
+        return {}
+    student = campaign.get("student") or {}
+    values = {
+        "categories": campaign.get("category"),
+        "countries": student.get("country"),
+        "fields_of_study": student.get("field_of_study")
+    }
+    return {facet: value for facet, value in values.items() if value is not None}
+
+
+async def get_campaign_facets(db) -> dict:
+    """Active campaign counts per category, country and field of study."""
+    counts = campaign_facets_cache.get("active")
+    if counts is not None:
+        return counts
+    
+    pipeline = [
+        {"$match": {"status": "active"}},
+        {"$facet": {
+            facet: [
+                {"$match": {field: {"$ne": None}}},
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+            ]
+            for facet, field in FACET_FIELDS.items()
+        }}
+    ]
+    result = await db.campaigns.aggregate(pipeline).to_list(1)
+    buckets = result[0] if result else {}
+    
+    counts = {
+        facet: {bucket["_id"]: bucket["count"] for bucket in buckets.get(facet, [])}
+        for facet in FACET_FIELDS
+    }
+    campaign_facets_cache.set("active", counts)
+    return counts
+
+
+def adjust_campaign_facets(before: Optional[dict], after: Optional[dict]) -> None:
+    """
+    Apply a campaign write to the cached facet counts instead of recounting.
+    `before`/`after` are the campaign documents around the write (None when
+    created or removed). Other workers pick the change up when their cache expires.
+    """
+    counts = campaign_facets_cache.peek("active")
+    if counts is None:
+        return
+    
+    for facet, value in _facet_values(before).items():
+        counts[facet][value] = counts[facet].get(value, 0) - 1
+        if counts[facet][value] <= 0:
+            del counts[facet][value]
+    for facet, value in _facet_values(after).items():
+        counts[facet][value] = counts[facet].get(value, 0) + 1
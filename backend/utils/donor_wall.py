@@ -0,0 +1,68 @@
+import os
+
+# Entries kept per campaign; the detail page shows the first 50
+DONOR_WALL_SIZE = int(os.environ.get("DONOR_WALL_SIZE", "100"))
+
+
+def donor_wall_entry(donation: dict) -> dict:
+    """Public donor wall entry for a donation (hides names if anonymous)."""
+    return {
+        "name": "Anonymous" if donation.get("anonymous") else donation.get("donor_name", "Anonymous"),
+        "amount": donation.get("amount"),
+        "date": donation.get("created_at"),
+        "anonymous": donation.get("anonymous", False)
+    }
+
+
+async def push_donor_wall_entry(db, donation: dict, session=None) -> None:
+    """
+    Add a paid donation to its campaign's wall, keeping the newest entries.
+    A campaign without a wall yet gets one built from all its donations, so
+    older donors are not hidden behind a one-entry wall.
+    """
+    result = await db.donor_walls.update_one(
+        {"campaign_id": donation["campaign_id"]},
+        {"$push": {"entries": {
+            "$each": [donor_wall_entry(donation)],
+            "$sort": {"date": -1},
+            "$slice": DONOR_WALL_SIZE
+        }}},
+        session=session
+    )
+    if result.matched_count == 0:
+        await rebuild_donor_wall(db, donation["campaign_id"], session=session)
+
+
+async def _latest_donor_wall_entries(db, campaign_id: str, limit: int, session=None) -> list:
+    donations = await db.donations.find(
+        {"campaign_id": campaign_id, "payment_status": "paid"},
+        {"_id": 0, "donor_name": 1, "amount": 1, "created_at": 1, "anonymous": 1},
+        session=session
+    ).sort("created_at", -1).to_list(limit)
+    return [donor_wall_entry(d) for d in donations]
+
+
+async def rebuild_donor_wall(db, campaign_id: str, session=None) -> None:
+    """Recompute a campaign's wall from its paid donations (e.g. after a refund)."""
+    entries = await _latest_donor_wall_entries(db, campaign_id, DONOR_WALL_SIZE, session=session)
+    await db.donor_walls.update_one(
+        {"campaign_id": campaign_id},
+        {"$set": {"entries": entries}},
+        upsert=True,
+        session=session
+    )
+
+
+async def get_donor_wall(db, campaign_id: str, limit: int = DONOR_WALL_SIZE) -> list:
+    """
+    Read a campaign's precomputed donor wall.
+    Falls back to querying donations for campaigns without one yet
+    (run backfill_campaigns.py to build them).
+    """
+    wall = await db.donor_walls.find_one(
+        {"campaign_id": campaign_id},
+        {"_id": 0, "entries": {"$slice": limit}}
+    )
+    if wall is None:
+        return await _latest_donor_wall_entries(db, campaign_id, limit)
+    return wall.get("entries", [])
@@ -0,0 +1,118 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from typing import Optional
+import csv
+import io
+import json
+import os
+
+# Rows fetched per cursor batch and written per response chunk
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+DONATION_EXPORT_FIELDS = [
+    "donation_id",
+    "created_at",
+    "campaign_id",
+    "donor_id",
+    "donor_name",
+    "donor_email",
+    "amount",
+    "anonymous",
+    "payment_status",
+    "stripe_session_id"
+]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def _parse_date(value: str, name: str) -> str:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    # Donations store created_at as UTC ISO strings, which sort chronologically
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def donation_export_query(
+    base: dict,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    campaign_id: Optional[str] = None
+) -> dict:
+    """Add date range [start, end) and campaign filters to `base`."""
+    query = dict(base)
+    if campaign_id:
+        query["campaign_id"] = campaign_id
+    created_at = {}
+    if start:
+        created_at["$gte"] = _parse_date(start, "start")
+    if end:
+        created_at["$lt"] = _parse_date(end, "end")
+    if created_at:
+        query["created_at"] = created_at
+    return query
+
+
+# Leading characters spreadsheets read as the start of a formula
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _escape_csv_cell(value):
+    """Neutralise user-supplied text that a spreadsheet would evaluate."""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _format_chunk(rows: list, fmt: str, header: bool) -> bytes:
+    if fmt == "ndjson":
+        return "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=DONATION_EXPORT_FIELDS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(
+        {field: _escape_csv_cell(value) for field, value in row.items()}
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def _stream_donations(db, query: dict, fmt: str):
+    projection = {"_id": 0, **{field: 1 for field in DONATION_EXPORT_FIELDS}}
+    cursor = db.donations.find(query, projection).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+    
+    rows = []
+    header = True
+    try:
+        async for donation in cursor:
+            rows.append(donation)
+            if len(rows) >= EXPORT_BATCH_SIZE:
+                yield _format_chunk(rows, fmt, header)
+                rows = []
+                header = False
+        if rows or header:
+            yield _format_chunk(rows, fmt, header)
+    finally:
+        # Release the server-side cursor if the client disconnects early
+        await cursor.close()
+
+
+def donation_export_response(db, query: dict, fmt: str, filename: str) -> StreamingResponse:
+    """Stream the donations matching `query` as NDJSON or CSV, one batch at a time."""
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    return StreamingResponse(
+        _stream_donations(db, query, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
@@ -0,0 +1,102 @@
+from fastapi import HTTPException
+from typing import Optional
+import asyncio
+import logging
+import os
+import re
+import time
+import httpx
+import jwt
+
+from utils.http_client import http_request
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URI = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+
+# Used when Google's response carries no Cache-Control max-age
+JWKS_CACHE_TTL = int(os.environ.get("GOOGLE_JWKS_CACHE_TTL", "3600"))
+# Unknown key ids trigger a refetch, but no more often than this
+JWKS_MIN_REFRESH_INTERVAL = 60
+
+
+class GoogleKeySet:
+    """Google's token signing keys, cached until they expire or rotate."""
+    
+    def __init__(self, jwks_uri: str = GOOGLE_JWKS_URI):
+        self.jwks_uri = jwks_uri
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def fetch(self) -> tuple:
+        """Download the key set; returns (jwks, max_age_seconds)."""
+        response = await http_request("GET", self.jwks_uri)
+        response.raise_for_status()
+        
+        match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else JWKS_CACHE_TTL
+        return response.json(), max_age
+    
+    async def refresh(self) -> None:
+        jwks, max_age = await self.fetch()
+        key_set = jwt.PyJWKSet.from_dict(jwks)
+        self._keys = {key.key_id: key for key in key_set.keys}
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max_age
+    
+    async def get_key(self, key_id: str) -> Optional[jwt.PyJWK]:
+        now = time.monotonic()
+        key = self._keys.get(key_id)
+        if key and now < self._expires_at:
+            return key
+        
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            key = self._keys.get(key_id)
+            expired = time.monotonic() >= self._expires_at
+            recently_fetched = time.monotonic() - self._fetched_at < JWKS_MIN_REFRESH_INTERVAL
+            if expired or (key is None and not recently_fetched):
+                await self.refresh()
+                key = self._keys.get(key_id)
+        return key
+    
+    def stats(self) -> dict:
+        return {"keys": len(self._keys), "expires_in": max(0, int(self._expires_at - time.monotonic()))}
+
+
+google_key_set = GoogleKeySet()
+
+
+async def verify_google_id_token(id_token: str, client_id: str, key_set: GoogleKeySet = google_key_set) -> dict:
+    """
+    Verify a Google ID token's signature, audience, issuer and expiry.
+    Returns its claims. Raises 400 if the token is invalid.
+    """
+    try:
+        key_id = jwt.get_unverified_header(id_token).get("kid")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=400, detail="Invalid ID token")
+    
+    try:
+        key = await key_set.get_key(key_id)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to fetch Google signing keys: {e}")
+        raise HTTPException(status_code=503, detail="Could not verify Google sign-in")
+    
+    if key is None:
+        raise HTTPException(status_code=400, detail="Invalid ID token")
+    
+    try:
+        return jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=client_id,
+            issuer=GOOGLE_ISSUERS,
+            options={"require": ["iss", "aud", "sub", "exp", "iat"]}
+        )
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=400, detail="Invalid ID token")
@@ -0,0 +1,109 @@
+from typing import Optional
+from urllib.parse import urlsplit
+import asyncio
+import logging
+import os
+import random
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.2"))
+
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Uploads carry files of up to 20MB, so Cloudinary gets more time to respond
+HOST_TIMEOUTS = {
+    "api.cloudinary.com": httpx.Timeout(60.0, connect=5.0),
+    "oauth2.googleapis.com": httpx.Timeout(10.0, connect=5.0),
+    "www.googleapis.com": httpx.Timeout(5.0, connect=3.0)
+}
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+_counters = {"requests": 0, "retries": 0, "failures": 0}
+
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(limits=limits, timeout=DEFAULT_TIMEOUT, transport=transport)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The application's shared outbound client, created on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def timeout_for(url: str) -> httpx.Timeout:
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+
+
+async def http_request(
+    method: str,
+    url: str,
+    *,
+    idempotent: Optional[bool] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    **kwargs
+) -> httpx.Response:
+    """
+    Send a request through the shared client with the host's timeout.
+    Idempotent calls are retried with backoff on transport errors and 502/503/504;
+    others only when the connection could not be made (nothing was sent).
+    """
+    client = client or get_http_client()
+    kwargs.setdefault("timeout", timeout_for(url))
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    
+    attempt = 0
+    while True:
+        _counters["requests"] += 1
+        try:
+            response = await client.request(method, url, **kwargs)
+            if not (idempotent and response.status_code in RETRY_STATUS_CODES and attempt < HTTP_RETRIES):
+                return response
+            await response.aclose()
+        except httpx.TransportError as e:
+            retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+            if not retryable or attempt >= HTTP_RETRIES:
+                _counters["failures"] += 1
+                raise
+            logger.warning(f"Retrying {method} {url} after {type(e).__name__}")
+        
+        attempt += 1
+        _counters["retries"] += 1
+        # Exponential backoff with jitter
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+def http_client_stats() -> dict:
+    stats = dict(_counters)
+    # httpx does not expose its pool publicly; report it when reachable
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is not None:
+        idle = sum(1 for connection in connections if connection.is_idle())
+        stats.update({"connections": len(connections), "idle": idle, "active": len(connections) - idle})
+    stats["max_connections"] = HTTP_MAX_CONNECTIONS
+    return stats
@@ -0,0 +1,37 @@
+from fastapi import HTTPException
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values: dict) -> str:
+    """Encode the sort key of the last returned row as an opaque cursor."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: list) -> dict:
+    """
+    Decode a cursor produced by encode_cursor.
+    Raises 400 if the cursor is malformed or missing any of `keys`.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if not isinstance(values, dict) or any(key not in values for key in keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_filter(field: str, value, tiebreak_field: str, tiebreak_value) -> dict:
+    """
+    Match rows strictly after (value, tiebreak_value) in a
+    descending (field, tiebreak_field) ordering.
+    """
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, tiebreak_field: {"$lt": tiebreak_value}}
+    ]}
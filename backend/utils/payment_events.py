@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+# Upper bound for how long a status request may be held open
+PAYMENT_STATUS_MAX_WAIT = float(os.environ.get("PAYMENT_STATUS_MAX_WAIT", "25"))
+
+
+class PaymentStatusNotifier:
+    """
+    Wakes requests waiting on a checkout session when its payment status changes.
+    Notifications are in-process only: a waiter on another worker times out and
+    re-reads the status instead.
+    """
+    
+    def __init__(self):
+        self._waiters = {}
+    
+    def subscribe(self, session_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        self._waiters.setdefault(session_id, set()).add(event)
+        return event
+    
+    def unsubscribe(self, session_id: str, event: asyncio.Event) -> None:
+        waiters = self._waiters.get(session_id)
+        if waiters is None:
+            return
+        waiters.discard(event)
+        if not waiters:
+            del self._waiters[session_id]
+    
+    def notify(self, session_id: str) -> None:
+        for event in self._waiters.get(session_id, ()):
+            event.set()
+    
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._waiters),
+            "waiters": sum(len(waiters) for waiters in self._waiters.values())
+        }
+
+
+payment_status_notifier = PaymentStatusNotifier()
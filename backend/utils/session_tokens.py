@@ -0,0 +1,124 @@
+"""
+Signed stateless session tokens (SESSION_MODE=signed).
+Tokens are revoked per user: anything issued before the revocation time
+is rejected. Revocations live in `revoked_sessions` and are synced into
+each worker periodically.
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+import jwt
+
+logger = logging.getLogger(__name__)
+
+SIGNING_ALGORITHM = "HS256"
+
+# Signed tokens live as long as opaque sessions
+SIGNED_SESSION_LIFETIME = timedelta(days=7)
+
+
+def signed_sessions_enabled() -> bool:
+    return os.environ.get("SESSION_MODE", "opaque") == "signed" and bool(os.environ.get("SECRET_KEY"))
+
+
+def looks_signed(session_token: str) -> bool:
+    """Opaque tokens are URL-safe base64 without dots; JWTs have three dot-separated parts."""
+    return session_token.count(".") == 2
+
+
+class RevocationList:
+    """In-process copy of per-user revocation times (epoch seconds)."""
+
+    def __init__(self):
+        self._revoked_at = {}
+        self.synced_at: Optional[float] = None
+
+    def is_revoked(self, user_id: str, issued_at: float) -> bool:
+        revoked_at = self._revoked_at.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    async def revoke(self, db, user_id: str) -> None:
+        """Reject all tokens issued to `user_id` up to now, here and (after sync) elsewhere."""
+        now = time.time()
+        self._revoked_at[user_id] = max(now, self._revoked_at.get(user_id, 0))
+        await db.revoked_sessions.update_one(
+            {"user_id": user_id},
+            {
+                "$max": {"revoked_at": now},
+                # Nothing issued before the revocation outlives this
+                "$set": {"expires_at": datetime.now(timezone.utc) + SIGNED_SESSION_LIFETIME}
+            },
+            upsert=True
+        )
+
+    async def sync(self, db) -> None:
+        """Merge revocations recorded by other workers."""
+        async for doc in db.revoked_sessions.find({}, {"_id": 0, "user_id": 1, "revoked_at": 1}):
+            current = self._revoked_at.get(doc["user_id"], 0)
+            self._revoked_at[doc["user_id"]] = max(current, doc["revoked_at"])
+        self.synced_at = time.time()
+
+    def stats(self) -> dict:
+        return {"size": len(self._revoked_at), "synced_at": self.synced_at}
+
+
+revocation_list = RevocationList()
+
+
+def issue_signed_token(user: dict, expires_at: datetime) -> str:
+    claims = {
+        "sub": user["user_id"],
+        "role": user.get("role"),
+        "email": user.get("email"),
+        "name": user.get("name"),
+        "picture": user.get("picture"),
+        "iat": time.time(),
+        "exp": expires_at
+    }
+    return jwt.encode(claims, os.environ["SECRET_KEY"], algorithm=SIGNING_ALGORITHM)
+
+
+def decode_signed_token(session_token: str) -> Optional[dict]:
+    """Return the claims of a valid, unrevoked token, else None."""
+    try:
+        claims = jwt.decode(
+            session_token,
+            os.environ["SECRET_KEY"],
+            algorithms=[SIGNING_ALGORITHM],
+            options={"require": ["sub", "iat", "exp"]}
+        )
+    except jwt.InvalidTokenError:
+        return None
+    
+    if revocation_list.is_revoked(claims["sub"], claims["iat"]):
+        return None
+    return claims
+
+
+def user_from_claims(claims: dict) -> dict:
+    return {
+        "user_id": claims["sub"],
+        "role": claims.get("role"),
+        "email": claims.get("email"),
+        "name": claims.get("name"),
+        "picture": claims.get("picture")
+    }
+
+
+def verify_signed_token(session_token: str) -> Optional[dict]:
+    """Return the user carried by a valid, unrevoked token, else None."""
+    claims = decode_signed_token(session_token)
+    return user_from_claims(claims) if claims else None
+
+
+async def sync_revocations_periodically(db, interval: float) -> None:
+    """Background task keeping this worker's revocation list current."""
+    while True:
+        try:
+            await revocation_list.sync(db)
+        except Exception as e:
+            logger.error(f"Failed to sync session revocations: {e}")
+        await asyncio.sleep(interval)
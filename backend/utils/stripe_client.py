@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import os
+
+# The Stripe SDK is synchronous; its calls run on a bounded thread pool so a
+# slow round trip never blocks the event loop
+STRIPE_MAX_CONCURRENCY = int(os.environ.get("STRIPE_MAX_CONCURRENCY", "10"))
+STRIPE_TIMEOUT = float(os.environ.get("STRIPE_TIMEOUT", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=STRIPE_MAX_CONCURRENCY, thread_name_prefix="stripe")
+_slots = asyncio.Semaphore(STRIPE_MAX_CONCURRENCY)
+_counters = {"calls": 0, "in_flight": 0, "timeouts": 0}
+
+
+async def _run_in_pool(func, *args, **kwargs):
+    await _slots.acquire()
+    _counters["in_flight"] += 1
+    
+    def release(_):
+        _counters["in_flight"] -= 1
+        _slots.release()
+    
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+    # The slot is held until the thread finishes, even if the caller timed out
+    future.add_done_callback(release)
+    return await asyncio.shield(future)
+
+
+async def call_stripe(func, *args, **kwargs):
+    """
+    Run a Stripe SDK call off the event loop, at most STRIPE_MAX_CONCURRENCY
+    at a time. Raises asyncio.TimeoutError after STRIPE_TIMEOUT seconds,
+    including time spent waiting for a free slot.
+    """
+    _counters["calls"] += 1
+    try:
+        return await asyncio.wait_for(_run_in_pool(func, *args, **kwargs), STRIPE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _counters["timeouts"] += 1
+        raise
+
+
+def stripe_stats() -> dict:
+    return {**_counters, "max_concurrency": STRIPE_MAX_CONCURRENCY, "timeout_seconds": STRIPE_TIMEOUT}
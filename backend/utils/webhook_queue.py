@@ -0,0 +1,266 @@
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_LEASE_SECONDS = float(os.environ.get("WEBHOOK_LEASE_SECONDS", "60"))
+WEBHOOK_POLL_INTERVAL = float(os.environ.get("WEBHOOK_POLL_INTERVAL", "1"))
+WEBHOOK_RETRY_BACKOFF = float(os.environ.get("WEBHOOK_RETRY_BACKOFF", "2"))
+WEBHOOK_MAX_BACKOFF = 3600
+# Processed events are kept this long for inspection, then expire
+WEBHOOK_RETENTION = timedelta(days=int(os.environ.get("WEBHOOK_RETENTION_DAYS", "7")))
+# Applied event ids are remembered well past Stripe's 3-day redelivery window
+PROCESSED_EVENT_RETENTION = timedelta(days=int(os.environ.get("PROCESSED_EVENT_RETENTION_DAYS", "30")))
+
+
+async def enqueue_webhook_event(db, event: dict) -> bool:
+    """
+    Persist a verified Stripe event for the workers.
+    Returns False if the event was already queued (Stripe redelivery).
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db.webhook_events.insert_one({
+            "event_id": event["id"],
+            "type": event.get("type"),
+            "payload": event,
+            "status": "pending",
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def claim_webhook_event(db, worker_id: str) -> Optional[dict]:
+    """Lease the next due event, including ones whose previous lease ran out."""
+    now = datetime.now(timezone.utc)
+    return await db.webhook_events.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "available_at": {"$lte": now}},
+            {"status": "processing", "lease_expires_at": {"$lte": now}}
+        ]},
+        {
+            "$set": {
+                "status": "processing",
+                "locked_by": worker_id,
+                "lease_expires_at": now + timedelta(seconds=WEBHOOK_LEASE_SECONDS)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def complete_webhook_event(db, queued: dict) -> None:
+    now = datetime.now(timezone.utc)
+    await db.webhook_events.update_one(
+        {"_id": queued["_id"], "locked_by": queued["locked_by"]},
+        {
+            "$set": {"status": "done", "processed_at": now, "expires_at": now + WEBHOOK_RETENTION},
+            "$unset": {"locked_by": "", "lease_expires_at": ""}
+        }
+    )
+
+
+async def fail_webhook_event(db, queued: dict, error: Exception, retry: bool = True) -> None:
+    """Schedule a retry with exponential backoff, or dead-letter the event."""
+    now = datetime.now(timezone.utc)
+    if not retry or queued["attempts"] >= WEBHOOK_MAX_ATTEMPTS:
+        dead_letter = {key: value for key, value in queued.items() if key != "_id"}
+        dead_letter.update({"status": "dead", "last_error": str(error), "failed_at": now})
+        await db.webhook_dead_letters.replace_one(
+            {"event_id": queued["event_id"]},
+            dead_letter,
+            upsert=True
+        )
+        await db.webhook_events.delete_one({"_id": queued["_id"], "locked_by": queued["locked_by"]})
+        logger.error(f"Webhook event {queued['event_id']} dead-lettered after {queued['attempts']} attempts: {error}")
+        return
+    
+    delay = min(WEBHOOK_RETRY_BACKOFF * (2 ** (queued["attempts"] - 1)), WEBHOOK_MAX_BACKOFF)
+    await db.webhook_events.update_one(
+        {"_id": queued["_id"], "locked_by": queued["locked_by"]},
+        {
+            "$set": {
+                "status": "pending",
+                "available_at": now + timedelta(seconds=delay),
+                "last_error": str(error)
+            },
+            "$unset": {"locked_by": "", "lease_expires_at": ""}
+        }
+    )
+    logger.warning(f"Webhook event {queued['event_id']} failed (attempt {queued['attempts']}), retrying in {delay}s: {error}")
+
+
+class EventInProgressError(Exception):
+    """Another handler holds a live lease on the event; retry it later."""
+
+
+class EventNotRecordedError(Exception):
+    """The event was applied but its marker could not be written; do not replay it."""
+
+
+async def begin_event_processing(db, event_id: str, event_type: Optional[str], owner: str) -> bool:
+    """
+    Lease an event's processed_events marker before applying it.
+    Returns False if the event was already applied. A marker left in progress
+    by a handler that crashed or failed is taken over once its lease runs out;
+    one still leased raises EventInProgressError.
+    """
+    now = datetime.now(timezone.utc)
+    done = {"$ifNull": ["$processed_at", False]}
+    # One round trip: the filter only matches markers that are done or whose
+    # lease ran out, so a live lease falls through to the upsert and collides
+    # with the unique event_id index. Done markers are left as they are.
+    try:
+        previous = await db.processed_events.find_one_and_update(
+            {
+                "event_id": event_id,
+                "$or": [
+                    {"processed_at": {"$exists": True}},
+                    {"lease_expires_at": {"$lte": now}}
+                ]
+            },
+            [{"$set": {
+                "type": {"$ifNull": ["$type", event_type]},
+                "status": {"$cond": [done, "$status", "in_progress"]},
+                "owner": {"$cond": [done, "$owner", owner]},
+                "lease_expires_at": {"$cond": [
+                    done, "$lease_expires_at", now + timedelta(seconds=WEBHOOK_LEASE_SECONDS)
+                ]},
+                "created_at": {"$ifNull": ["$created_at", now]},
+                "expires_at": {"$ifNull": ["$expires_at", now + PROCESSED_EVENT_RETENTION]}
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        raise EventInProgressError(f"Event {event_id} is being processed elsewhere")
+    
+    return previous is None or "processed_at" not in previous
+
+
+async def finish_event_processing(db, event_id: str, owner: str, retry_for: float = 0) -> None:
+    """
+    Mark a leased event as applied; later deliveries are skipped.
+    The event has already been applied, so a failed write is retried for up to
+    `retry_for` seconds and then raised as EventNotRecordedError rather than
+    left for the lease to expire and the event to run again.
+    """
+    deadline = time.monotonic() + retry_for
+    delay = 0.1
+    while True:
+        try:
+            await db.processed_events.update_one(
+                {"event_id": event_id, "owner": owner},
+                {
+                    "$set": {"status": "done", "processed_at": datetime.now(timezone.utc)},
+                    "$unset": {"owner": "", "lease_expires_at": ""}
+                }
+            )
+            return
+        except PyMongoError as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise EventNotRecordedError(
+                    f"Event {event_id} was applied but could not be recorded: {e}"
+                ) from e
+            logger.warning(f"Could not record processed event {event_id}, retrying: {e}")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 5)
+
+
+async def release_event_processing(db, event_id: str, owner: str) -> None:
+    """
+    Drop a failed handler's lease so the retry need not wait for it to expire.
+    Best effort: if MongoDB is unreachable the lease simply runs out.
+    """
+    try:
+        await db.processed_events.delete_one(
+            {"event_id": event_id, "owner": owner, "status": "in_progress"}
+        )
+    except Exception as e:
+        logger.warning(f"Could not release processed_events lease for {event_id}: {e}")
+
+
+class WebhookWorkerPool:
+    """
+    asyncio workers draining the webhook_events queue. `handler(db, event)`
+    processes one Stripe event payload and raises to request a retry.
+    """
+    
+    def __init__(self, db, handler, size: int = WEBHOOK_WORKERS):
+        self.db = db
+        self.handler = handler
+        self.size = size
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._counters = {"processed": 0, "retried": 0, "dead_lettered": 0}
+    
+    def start(self) -> None:
+        for index in range(self.size):
+            worker_id = f"{uuid.uuid4().hex[:8]}-{index}"
+            self._tasks.append(asyncio.create_task(self._run(worker_id)))
+    
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def wake(self) -> None:
+        """Skip the poll delay after an event was queued by this process."""
+        self._wakeup.set()
+    
+    async def process_next(self, worker_id: str) -> bool:
+        """Claim and process one event; returns False when none is due."""
+        queued = await claim_webhook_event(self.db, worker_id)
+        if queued is None:
+            return False
+        
+        try:
+            await self.handler(self.db, queued["payload"])
+        except Exception as e:
+            # An applied but unrecorded event must not be replayed automatically
+            retry = not isinstance(e, EventNotRecordedError)
+            if not retry or queued["attempts"] >= WEBHOOK_MAX_ATTEMPTS:
+                self._counters["dead_lettered"] += 1
+            else:
+                self._counters["retried"] += 1
+            await fail_webhook_event(self.db, queued, e, retry=retry)
+        else:
+            self._counters["processed"] += 1
+            await complete_webhook_event(self.db, queued)
+        return True
+    
+    async def _run(self, worker_id: str) -> None:
+        while True:
+            try:
+                if await self.process_next(worker_id):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker {worker_id} error: {e}")
+            
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), WEBHOOK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    def stats(self) -> dict:
+        return {**self._counters, "workers": len(self._tasks)}
@@ -5,7 +5,7 @@ import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import CampaignCard from '../components/CampaignCard';
-import { getCampaigns, getCategories, getCountries, getFieldsOfStudy } from '../services/api';
+import { getCampaigns, getCampaignFacets, getCategories, getCountries, getFieldsOfStudy } from '../services/api';
 
 const Browse = () => {
   const [searchParams, setSearchParams] = useSearchParams();
@@ -13,8 +13,10 @@ const Browse = () => {
   const [categories, setCategories] = useState([]);
   const [countries, setCountries] = useState([]);
   const [fieldsOfStudy, setFieldsOfStudy] = useState([]);
+  const [facets, setFacets] = useState({});
   const [loading, setLoading] = useState(true);
-  const [pagination, setPagination] = useState({ total: 0, page: 1, total_pages: 0 });
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [pagination, setPagination] = useState({ total: 0, page: 1, total_pages: 0, next_cursor: null });
 
   const [searchQuery, setSearchQuery] = useState(searchParams.get('search') || '');
   const [selectedCategory, setSelectedCategory] = useState(searchParams.get('category') || 'all');
@@ -40,18 +42,43 @@ const Browse = () => {
     loadStaticData();
   }, []);
 
+  // Load live campaign counts for the filter options
+  useEffect(() => {
+    const loadFacets = async () => {
+      try {
+        const response = await getCampaignFacets();
+        const counts = {};
+        Object.entries(response.data || {}).forEach(([facet, buckets]) => {
+          counts[facet] = Object.fromEntries(buckets.map((b) => [b.value, b.count]));
+        });
+        setFacets(counts);
+      } catch (error) {
+        console.error('Failed to load filter counts:', error);
+      }
+    };
+    loadFacets();
+  }, []);
+
+  const facetLabel = (facet, value) => {
+    const count = facets[facet]?.[value];
+    return count !== undefined ? ` (${count})` : '';
+  };
+
+  const buildParams = () => {
+    const params = {};
+    if (searchQuery) params.search = searchQuery;
+    if (selectedCategory && selectedCategory !== 'all') params.category = selectedCategory;
+    if (selectedCountry && selectedCountry !== 'all') params.country = selectedCountry;
+    if (selectedField && selectedField !== 'all') params.field_of_study = selectedField;
+    return params;
+  };
+
   // Load campaigns when filters change
   useEffect(() => {
     const loadCampaigns = async () => {
       setLoading(true);
       try {
-        const params = {};
-        if (searchQuery) params.search = searchQuery;
-        if (selectedCategory && selectedCategory !== 'all') params.category = selectedCategory;
-        if (selectedCountry && selectedCountry !== 'all') params.country = selectedCountry;
-        if (selectedField && selectedField !== 'all') params.field_of_study = selectedField;
-
-        const response = await getCampaigns(params);
+        const response = await getCampaigns(buildParams());
         setCampaigns(response.data || []);
         setPagination(response.pagination || { total: 0, page: 1, total_pages: 0 });
       } catch (error) {
@@ -64,6 +91,21 @@ const Browse = () => {
     loadCampaigns();
   }, [searchQuery, selectedCategory, selectedCountry, selectedField]);
 
+  // Append the next page using the keyset cursor from the last response
+  const loadMore = async () => {
+    if (!pagination.next_cursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await getCampaigns({ ...buildParams(), cursor: pagination.next_cursor });
+      setCampaigns((prev) => [...prev, ...(response.data || [])]);
+      setPagination((prev) => ({ ...prev, next_cursor: response.pagination?.next_cursor || null }));
+    } catch (error) {
+      console.error('Failed to load more campaigns:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const clearFilters = () => {
     setSearchQuery('');
     setSelectedCategory('all');
@@ -112,7 +154,7 @@ const Browse = () => {
                 <SelectItem value="all">All Categories</SelectItem>
                 {categories.map((cat) => (
                   <SelectItem key={cat.id} value={cat.id}>
-                    {cat.name}
+                    {cat.name}{facetLabel('categories', cat.id)}
                   </SelectItem>
                 ))}
               </SelectContent>
@@ -127,7 +169,7 @@ const Browse = () => {
                 <SelectItem value="all">All Countries</SelectItem>
                 {countries.map((country) => (
                   <SelectItem key={country} value={country}>
-                    {country}
+                    {country}{facetLabel('countries', country)}
                   </SelectItem>
                 ))}
               </SelectContent>
@@ -142,7 +184,7 @@ const Browse = () => {
                 <SelectItem value="all">All Fields</SelectItem>
                 {fieldsOfStudy.map((field) => (
                   <SelectItem key={field} value={field}>
-                    {field}
+                    {field}{facetLabel('fields_of_study', field)}
                   </SelectItem>
                 ))}
               </SelectContent>
@@ -153,7 +195,7 @@ const Browse = () => {
         {/* Results */}
         <div className="mb-6">
           <p className="text-gray-600">
-            Showing <span className="font-semibold">{campaigns.length}</span> of {pagination.total} campaigns
+            Showing <span className="font-semibold">{campaigns.length}</span> of {pagination.total}{pagination.total_exact === false ? '+' : ''} campaigns
           </p>
         </div>
 
@@ -163,11 +205,20 @@ const Browse = () => {
             <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-blue-600"></div>
           </div>
         ) : campaigns.length > 0 ? (
-          <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-8">
-            {campaigns.map((campaign) => (
-              <CampaignCard key={campaign.campaign_id} campaign={campaign} />
-            ))}
-          </div>
+          <>
+            <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-8">
+              {campaigns.map((campaign) => (
+                <CampaignCard key={campaign.campaign_id} campaign={campaign} />
+              ))}
+            </div>
+            {pagination.next_cursor && (
+              <div className="flex justify-center mt-10">
+                <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Loading...' : 'Load More'}
+                </Button>
+              </div>
+            )}
+          </>
         ) : (
           <div className="text-center py-16">
             <p className="text-xl text-gray-600">No campaigns found matching your criteria.</p>
@@ -27,6 +27,9 @@ const Dashboard = ({ user }) => {
   const [allCampaigns, setAllCampaigns] = useState([]);
   const [myCampaigns, setMyCampaigns] = useState([]);
   const [myDonations, setMyDonations] = useState([]);
+  const [donationSummary, setDonationSummary] = useState(null);
+  const [donationsCursor, setDonationsCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const currentUser = user?.data || user || { role: 'donor' };
 
@@ -61,6 +64,8 @@ const Dashboard = ({ user }) => {
         try {
           const donationsRes = await getMyDonations();
           setMyDonations(donationsRes.data || []);
+          setDonationSummary(donationsRes.summary || null);
+          setDonationsCursor(donationsRes.pagination?.next_cursor || null);
         } catch (e) {
           setMyDonations([]);
         }
@@ -77,6 +82,21 @@ const Dashboard = ({ user }) => {
     }
   };
 
+  // Append the next page of donation history
+  const loadMoreDonations = async () => {
+    if (!donationsCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await getMyDonations({ cursor: donationsCursor });
+      setMyDonations((prev) => [...prev, ...(response.data || [])]);
+      setDonationsCursor(response.pagination?.next_cursor || null);
+    } catch (error) {
+      console.error('Failed to load more donations:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleVerify = async (userId, action) => {
     try {
       await verifyStudent(userId, action);
@@ -448,7 +468,8 @@ const Dashboard = ({ user }) => {
   }
 
   // Donor Dashboard
-  const totalDonated = myDonations.reduce((sum, d) => sum + (d.amount || 0), 0);
+  const totalDonated = donationSummary?.total_donated ?? myDonations.reduce((sum, d) => sum + (d.amount || 0), 0);
+  const campaignsSupported = donationSummary?.campaign_count ?? myDonations.length;
 
   return (
     <div className="min-h-screen bg-gray-50 py-8">
@@ -476,7 +497,7 @@ const Dashboard = ({ user }) => {
               <div className="flex items-center justify-between">
                 <div>
                   <p className="text-sm text-gray-600 mb-1">Students Supported</p>
-                  <p className="text-3xl font-bold text-green-600">{myDonations.length}</p>
+                  <p className="text-3xl font-bold text-green-600">{campaignsSupported}</p>
                 </div>
                 <Users className="h-10 w-10 text-green-600" />
               </div>
@@ -487,7 +508,7 @@ const Dashboard = ({ user }) => {
               <div className="flex items-center justify-between">
                 <div>
                   <p className="text-sm text-gray-600 mb-1">Impact Score</p>
-                  <p className="text-3xl font-bold text-purple-600">{Math.min(100, myDonations.length * 10 + 50)}</p>
+                  <p className="text-3xl font-bold text-purple-600">{Math.min(100, (donationSummary?.donation_count ?? myDonations.length) * 10 + 50)}</p>
                 </div>
                 <TrendingUp className="h-10 w-10 text-purple-600" />
               </div>
@@ -526,6 +547,13 @@ const Dashboard = ({ user }) => {
                     </div>
                   </div>
                 ))}
+                {donationsCursor && (
+                  <div className="flex justify-center pt-2">
+                    <Button variant="outline" onClick={loadMoreDonations} disabled={loadingMore}>
+                      {loadingMore ? 'Loading...' : 'Load More'}
+                    </Button>
+                  </div>
+                )}
               </div>
             ) : (
               <div className="text-center py-8">
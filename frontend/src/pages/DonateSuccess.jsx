@@ -21,9 +21,11 @@ const DonateSuccess = () => {
       return;
     }
 
+    // Each request waits server-side for the webhook, so no delay between attempts
     const checkPayment = async (attempts = 0) => {
-      const maxAttempts = 10;
-      const pollInterval = 2000;
+      const maxAttempts = 4;
+      const waitSeconds = 20;
+      const retryDelay = 2000;
 
       if (attempts >= maxAttempts) {
         setStatus('error');
@@ -31,7 +33,7 @@ const DonateSuccess = () => {
       }
 
       try {
-        const response = await getPaymentStatus(sessionId);
+        const response = await getPaymentStatus(sessionId, waitSeconds);
         
         if (response.data.payment_status === 'paid') {
           setPaymentData(response.data);
@@ -52,14 +54,14 @@ const DonateSuccess = () => {
           return;
         }
 
-        // Continue polling
-        setTimeout(() => checkPayment(attempts + 1), pollInterval);
+        // Still pending after the wait; ask again
+        checkPayment(attempts + 1);
       } catch (error) {
         console.error('Error checking payment:', error);
         if (attempts >= maxAttempts - 1) {
           setStatus('error');
         } else {
-          setTimeout(() => checkPayment(attempts + 1), pollInterval);
+          setTimeout(() => checkPayment(attempts + 1), retryDelay);
         }
       }
     };
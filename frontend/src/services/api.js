@@ -39,6 +39,8 @@ export const getCampaigns = (params = {}) => {
   return apiCall(`/campaigns${queryString ? `?${queryString}` : ''}`, {}, false);
 };
 
+export const getCampaignFacets = () => apiCall('/campaigns/facets', {}, false);
+
 export const getCampaign = (campaignId) => apiCall(`/campaigns/${campaignId}`, {}, false);
 
 export const getMyCampaigns = () => apiCall('/campaigns/my');
@@ -62,13 +64,17 @@ export const createCheckout = (donationData) =>
     body: JSON.stringify(donationData),
   }, false);
 
-export const getPaymentStatus = (sessionId) =>
-  apiCall(`/donations/status/${sessionId}`, {}, false);
+// With `wait`, the server holds the request until the payment settles (long poll)
+export const getPaymentStatus = (sessionId, wait = 0) =>
+  apiCall(`/donations/status/${sessionId}${wait ? `?wait=${wait}` : ''}`, {}, false);
 
 export const getCampaignDonations = (campaignId) =>
   apiCall(`/donations/campaign/${campaignId}`, {}, false);
 
-export const getMyDonations = () => apiCall('/donations/my');
+export const getMyDonations = (params = {}) => {
+  const queryString = new URLSearchParams(params).toString();
+  return apiCall(`/donations/my${queryString ? `?${queryString}` : ''}`);
+};
 
 // Auth endpoints
 export const getCurrentUser = () => apiCall('/auth/me');
@@ -121,6 +127,7 @@ export default {
   getFieldsOfStudy,
   getCampaigns,
   getCampaign,
+  getCampaignFacets,
   getMyCampaigns,
   createCampaign,
   updateCampaign,